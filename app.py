@@ -1,7 +1,3 @@
-import torch
-from torch import nn
-from torch import optim
-
 from flask import Flask
 from flask import request
 from flask_cors import CORS
@@ -11,220 +7,27 @@ import numpy as np
 import pandas as pd
 
 import io
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 from textwrap import dedent
 from base64 import b64encode
 from natsort import natsorted
 import os
 
+from dimbridge.datautils import load_columns, save_columns
+from dimbridge.predicate_engine import Cancelled, prepare_data
+from dimbridge.result_cache import ResultCache, cached_predicate_sequence, data_digest
+
 # from tqdm import tqdm
 
 # create Flask app
 app = Flask(__name__, static_url_path="/static", static_folder="datasets")
 CORS(app)
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print("device", device)
-
-
-def predict(x, a, mu):
-    r"""
-    UMAP-inspired predict function.
-    A bump function centered at $\\mu$ with extent determined by $1/|a|$.
-
-    $$ pred = \frac{1}{1+ \sum_{i=1}^{p} |a_i| * |x_i - \mu_i|^{b}} $$
-
-    Parameters
-    ----------
-    x - Torch tensor, shape [n_data_points, n_features]
-        Input data points
-    a - Torch tensor, shape [n_features]
-        A parameter for the bounding box extent. 1/a.abs() is the extent of bounding box at prediction=0.5
-    mu - Torch tensor, shape [n_features]
-        A parameter for the bounding box center
-    b - Scalar.
-        Hyperparameter for predict function. Power exponent
-
-    Returns
-    -------
-    pred - Torch tensor of predction for each point in x, shape = [n_data_points, 1]
-    """
-
-    b = 4
-    pred = 1 / (1 + ((a.abs() * (x - mu).abs()).pow(b)).sum(1))
-    return pred
-
-
-def compute_predicate_sequence(
-    x0,
-    selected,
-    attribute_names=[],
-    n_iter=1000,
-    device=device,
-):
-    """
-    x0 - numpy array, shape=[n_points, n_feature]. Data points
-    selected - boolean array. shape=[brush_index, n_points] of selection
-    """
-
-    n_points, n_features = x0.shape
-    n_brushes = selected.shape[0]
-
-    # prepare training data
-    # orginal data extent
-    vmin = x0.min(0)
-    vmax = x0.max(0)
-    x = torch.from_numpy(x0.astype(np.float32)).to(device)
-    label = torch.from_numpy(selected).float().to(device)
-    # normalize
-    mean = x.mean(0)
-    scale = x.std(0) + 1e-2
-    x = (x - mean) / scale
-
-    # Trainable parameters
-    # since data is normalized,
-    # mu can initialized around mean_pos examples
-    # a can initialized around a constant across all axes
-    selection_centroids = torch.stack([x[sel_t].mean(0) for sel_t in selected], 0)
-    selection_std = torch.stack([x[sel_t].std(0) for sel_t in selected], 0)
-    print(selection_std)
-
-    # initialize the bounding box center (mu) at the data centroid, +-0.1 at random
-    mu_init = selection_centroids
-    a_init = 1 / selection_std
-    # a = (a_init + 0.1 * (2 * torch.rand(n_brushes, n_features) - 1)).to(device)
-    # mu = mu_init + 0.1 * (2 * torch.rand(n_brushes, x.shape[1], device=device) - 1)
-    a = a_init.to(device)
-    mu = mu_init.to(device)
-    a.requires_grad_(True)
-    mu.requires_grad_(True)
-
-    # For each brush,
-    # weight-balance selected vs. unselected based on their size
-    # and create a weighted BCE loss function (for each brush)
-    bce_per_brush = []
-    for st in selected:  # for each brush, define their class-balanced loss function
-        n_selected = st.sum()  # st is numpy array
-        n_unselected = n_points - n_selected
-        instance_weight = torch.ones(x.shape[0]).to(device)
-        instance_weight[st] = n_points / n_selected
-        instance_weight[~st] = n_points / n_unselected
-        bce = nn.BCELoss(weight=instance_weight)
-        bce_per_brush.append(bce)
-
-    optimizer = optim.SGD(
-        [
-            {"params": mu, "weight_decay": 0},
-            # smaller a encourages larger range of the bounding box
-            {"params": a, "weight_decay": 0.25},
-        ],
-        lr=1e-2,
-        momentum=0.4,
-        nesterov=True,
-    )
-
-    # training loop
-    for e in range(n_iter):
-        loss_per_brush = []
-        for t, st in enumerate(selected):  # for each brush, compute loss
-            # TODO try subsample:
-            # use all selected data
-            # randomly sample unselected data with similar size
-            pred = predict(x, a[t], mu[t])
-            loss = bce(pred, label[t])
-            # loss += (mu[t] - selection_centroids[t]).pow(2).mean() * 20
-            loss_per_brush.append(loss)
-            smoothness_loss = 0
-            if len(selected) == 2:
-                smoothness_loss += 5 * (a[1:] - a[:-1]).pow(2).mean()
-                smoothness_loss += 1 * (mu[1:] - mu[:-1]).pow(2).mean()
-            elif len(selected) > 2:
-                smoothness_loss += 500 * (a[1:] - a[:-1]).pow(2).mean()
-                smoothness_loss += 10 * (mu[1:] - mu[:-1]).pow(2).mean()
-
-        # print('bce', loss_per_brush)
-        # print('smoothness', smoothness_loss.item())
-        # sparsity_loss = 0
-        # sparsity_loss = a.abs().mean() * 100
-        total_loss = sum(loss_per_brush) + smoothness_loss  # + sparsity_loss
-        optimizer.zero_grad()
-        total_loss.backward()
-        optimizer.step()
-        if e % max(1, (n_iter // 10)) == 0:
-            # print(pred.min().item(), pred.max().item())
-            print(f"[{e:>4}] loss {loss.item()}")
-    a.detach_()
-    mu.detach_()
-    # plt.stem(a.abs().numpy()); plt.show()
-
-    qualities = []
-    for t, st in enumerate(selected):  # for each brush, compute quality
-        pred = predict(x, a[t], mu[t])
-        pred = (pred > 0.5).float()
-        correct = (pred == label[t]).float().sum().item()
-        total = n_points
-        accuracy = correct / total
-        # 1 meaning points are selected
-        tp = ((pred == 1).float() * (label == 1).float()).sum().item()
-        fp = ((pred == 1).float() * (label == 0).float()).sum().item()
-        fn = ((pred == 0).float() * (label == 1).float()).sum().item()
-        precision = tp / (tp + fp) if tp + fp > 0 else 0
-        recall = tp / (tp + fn) if tp + fn > 0 else 0
-        f1 = 2 / (1 / precision + 1 / recall) if precision > 0 and recall > 0 else 0
-        print(
-            dedent(
-                f"""
-            brush = {t}
-            accuracy = {accuracy}
-            precision = {precision}
-            recall = {recall}
-            f1 = {f1}
-        """
-            )
-        )
-        qualities.append(
-            dict(brush=t, accuracy=accuracy, precision=precision, recall=recall, f1=f1)
-        )
-
-    # predicate clause selection
-    # r is the range of the bounding box on each dimension
-    # bounding box is defined by the level set of prediction=0.5
-    predicates = []
-    # for each brush, generate a predicate from a[t] and mu[t]
-    for t, st in enumerate(selected):
-        r = 1 / a[t].abs()
-        predicate_clauses = []
-        for k in range(n_features):  # for each attribute
-            vmin_selected = x0[st, k].min()
-            vmax_selected = x0[st, k].max()
-            # denormalize
-            r_k = (r[k] * scale[k]).item()
-            mu_k = (mu[t, k] * scale[k] + mean[k]).item()
-            ci = [mu_k - r_k, mu_k + r_k]
-            assert ci[0] < ci[1], "ci[0] is not less than ci[1]"
-            if ci[0] < vmin[k]:
-                ci[0] = vmin[k]
-            if ci[1] > vmax[k]:
-                ci[1] = vmax[k]
-
-            # feature selection based on extent range
-            #         should_include = r[k] < 1.0 * (x[:,k].max()-x[:,k].min())
-            should_include = not (ci[0] <= vmin[k] and ci[1] >= vmax[k])
-
-            if should_include:
-                if ci[0] < vmin_selected:
-                    ci[0] = vmin_selected
-                if ci[1] > vmax_selected:
-                    ci[1] = vmax_selected
-                predicate_clauses.append(
-                    dict(
-                        dim=k,
-                        interval=ci,
-                        attribute=columns[k],
-                    )
-                )
-        predicates.append(predicate_clauses)
-    parameters = dict(mu=mu, a=a)
-    return predicates, qualities, parameters
 
 
 def load_data(
@@ -258,9 +61,9 @@ def load_data(
 
     df = pd.read_csv(dataset_filename)
 
-    # drop all string columns
+    # drop all string columns (object dtype, or the string dtype of pandas >= 3)
     for column in df.columns:
-        if df[column].dtype == "O":
+        if df[column].dtype == "O" or pd.api.types.is_string_dtype(df[column]):
             df = df.drop(column, axis="columns")
 
     # drop exclude_columns
@@ -276,9 +79,138 @@ def load_data(
     return x0, columns
 
 
-current_dataset = None
-x0 = None
-columns = None
+def load_columnar_data(dataset_dir, exclude_columns=["x", "y"]):
+    """
+    Same as load_data, for a dataset converted by convert_dataset.
+    Columns are memory-mapped, so loading costs one copy of the numeric columns into x0,
+    read from the page cache instead of parsed from text
+    """
+    schema, data = load_columns(dataset_dir)
+    columns = [
+        c["name"]
+        for c in schema["columns"]
+        if c["dtype"] != "json" and c["name"] not in exclude_columns
+    ]
+    # column-major, like DataFrame.to_numpy(), so that each column is one sequential copy
+    x0 = np.empty(
+        (schema["n_rows"], len(columns)),
+        dtype=np.result_type(*[data[c].dtype for c in columns]),
+        order="F",
+    )
+    for j, c in enumerate(columns):
+        x0[:, j] = data[c]
+    return x0, pd.Index(columns)
+
+
+def convert_dataset(dataset):
+    """
+    One-time conversion of ./datasets/<dataset>/*.csv to column-wise binary files
+    (./datasets/<dataset>/schema.json and columns/*.npy, see dimbridge.datautils.save_columns).
+    The server then loads the dataset from these files instead of the csv
+    """
+    dataset_filename = glob(f"./datasets/{dataset}/*.csv")[0]
+    save_columns(pd.read_csv(dataset_filename), f"./datasets/{dataset}")
+
+
+def is_converted(dataset):
+    return os.path.exists(f"./datasets/{dataset}/schema.json")
+
+
+# LRU cache of prepared datasets: dataset name -> dict(x0, columns, prepared),
+# least recently used first. Evicts datasets once their total size (see dataset_nbytes)
+# exceeds dataset_cache_bytes (the most recently used dataset is kept even if it alone
+# exceeds the budget)
+dataset_cache = OrderedDict()
+dataset_cache_bytes = int(float(os.environ.get("DIMBRIDGE_CACHE_MB", 1024)) * 2**20)
+dataset_cache_stats = dict(hits=0, misses=0, evictions=0)
+dataset_cache_lock = threading.Lock()
+
+# optional persistent cache of predicate results (--result_cache), shared by processes
+result_cache = None
+
+
+def dataset_nbytes(entry):
+    """
+    Memory held by a cached dataset: the numpy arrays of its prepared data, and what engines
+    cache in it on first use, i.e., the torch copies of the training data ("autograd" and
+    "fused" engines; on cuda they take device memory instead of host memory) and the
+    shared memory of ShardPool workers ("parallel" engine).
+    Object arrays (data frames of mixed column types) hold pointers to Python objects,
+    so they are counted as their pointers plus the float64 array they convert to
+    """
+    prepared = entry["prepared"]
+    x = prepared.get("x")
+    nbytes = 0
+    for key, value in prepared.items():
+        if isinstance(value, np.ndarray) and value.dtype == object:
+            nbytes += value.nbytes + value.size * np.dtype(np.float64).itemsize
+        elif isinstance(value, np.ndarray):
+            nbytes += value.nbytes
+        elif key.startswith("x_torch_"):
+            # torch.from_numpy on the cpu shares the buffer of x, which is counted already
+            if not (value.device.type == "cpu" and value.data_ptr() == x.ctypes.data):
+                nbytes += value.element_size() * value.nelement()
+        elif key.startswith("shard_pool_"):
+            nbytes += value.nbytes
+    return nbytes
+
+
+def evict_datasets():
+    """
+    Evict the least recently used datasets until the cache fits in dataset_cache_bytes.
+    The ShardPool workers of evicted datasets are shut down right away, rather than whenever
+    the garbage collector gets to them, to free their processes and shared memory
+    """
+    evicted = []
+    with dataset_cache_lock:
+        total = sum(dataset_nbytes(e) for e in dataset_cache.values())
+        while total > dataset_cache_bytes and len(dataset_cache) > 1:
+            _, entry = dataset_cache.popitem(last=False)
+            total -= dataset_nbytes(entry)
+            dataset_cache_stats["evictions"] += 1
+            evicted.append(entry)
+    for entry in evicted:
+        for key, value in entry["prepared"].items():
+            if key.startswith("shard_pool_"):
+                with value.lock:  # after the step in flight, if any
+                    value.close()
+
+
+def get_prepared_dataset(dataset, verbose=True):
+    """
+    Data of a dataset, from the cache or loaded from its csv
+
+    Returns
+    -------
+    dict with
+    x0 - numpy array, shape == [n_points, n_columns], as returned by load_data
+    columns - column names of x0
+    prepared - normalized training data, see dimbridge.predicate_engine.prepare_data
+    """
+    with dataset_cache_lock:
+        entry = dataset_cache.get(dataset)
+        if entry is not None:
+            dataset_cache.move_to_end(dataset)
+            dataset_cache_stats["hits"] += 1
+            return entry
+        dataset_cache_stats["misses"] += 1
+
+    if is_converted(dataset):
+        x0, columns = load_columnar_data(f"./datasets/{dataset}")
+    else:
+        # assumes only one csv file under the directory
+        dataset_filename = glob(f"./datasets/{dataset}/*.csv")[0]
+        x0, columns = load_data(dataset_filename)
+    if verbose:
+        print("data columns", columns)
+    prepared = prepare_data(x0)
+    entry = dict(x0=x0, columns=columns, prepared=prepared)
+
+    with dataset_cache_lock:
+        dataset_cache[dataset] = entry
+        dataset_cache.move_to_end(dataset)
+    evict_datasets()
+    return entry
 
 
 @app.route("/get_dummy", methods=["GET"])
@@ -309,38 +241,216 @@ def get_dataset(dataset_name):
 
 @app.route("/get_predicates", methods=["POST"])
 def get_predicate():
-    global current_dataset, x0, columns
-    print("[request keys]", request.json.keys())
-    dataset = request.json["dataset"]
+    return compute_predicates(request.json)
+
+
+def compute_predicates(params, is_cancelled=None, progress=None):
+    """
+    Predicates of the brushed subsets of a dataset, for the request body `params` of
+    /get_predicates or /submit_predicates. Runs in the Flask process, or in a job_pool worker
+    """
+    verbose = params.get("verbose", True)
+    if verbose:
+        print("[request keys]", params.keys())
+    dataset = params["dataset"]
     if dataset.endswith("_local"):
         dataset = dataset[: -len("_local")]
 
-    # load dataset csv
-    if current_dataset != dataset:  # TODO keep track of multiple datasets
-        # assumes only one csv file under the directory
-        dataset_filename = glob(f"./datasets/{dataset}/*.csv")[0]
-        x0, columns = load_data(dataset_filename)
-        print("data columns", columns)
-        current_dataset = dataset
+    # load dataset csv, or get it from the cache
+    load_start = time.perf_counter()
+    entry = get_prepared_dataset(dataset, verbose=verbose)
+    x0 = entry["x0"]
+    columns = entry["columns"]
+    if result_cache is not None and "digest" not in entry:
+        entry["digest"] = data_digest(x0)  # hashed once per cached dataset
+    load_ms = (time.perf_counter() - load_start) * 1000
 
     # Get the subsets of selected points, a 2D array of boolean values
     # indexed by [brush number, data point index]
-    subsets = np.array(request.json["subsets"])
-    print(x0.shape)
+    subsets = np.array(params["subsets"])
+    if verbose:
+        print(x0.shape)
 
     # Jointly optimize the sequence
-    predicates, qualities, parameters = compute_predicate_sequence(
+    # optional training settings: n_iter, tol (null disables early stopping), time_budget_ms,
+    # engine ("numpy", or "autograd"/"fused" with torch installed), solver ("sgd" or "lbfgs"),
+    # verbose (false silences the progress bar and quality printout).
+    # With --result_cache, results of the same data, subsets and settings are read from disk
+    predicates, qualities, parameters, info = cached_predicate_sequence(
+        result_cache,
         x0,
         subsets,
+        data_key=entry.get("digest"),
         attribute_names=columns,
+        prepared=entry["prepared"],
+        is_cancelled=is_cancelled,
+        progress=progress,
+        n_iter=params.get("n_iter", 1000),
+        tol=params.get("tol", 1e-4),
+        time_budget_ms=params.get("time_budget_ms"),
+        engine=params.get("engine", "numpy"),
+        solver=params.get("solver", "sgd"),
+        verbose=verbose,
     )
+    # the engine may have cached a torch copy or worker pool of the data in entry["prepared"]
+    evict_datasets()
 
     return dict(
         predicates=predicates,
         qualities=qualities,
+        n_iter=info["n_iter"],
+        # per-phase timing of the predicate engine, plus loading the dataset (load_ms)
+        timing=dict(info["timing"], load_ms=load_ms),
     )
 
 
+# Predicate jobs (/submit_predicates, /get_job, /cancel_job) run on a pool of worker processes,
+# so that training neither blocks request handlers nor holds the GIL of the Flask process.
+# Each worker process keeps its own dataset cache.
+job_pool = None  # created on the first job
+job_pool_workers = int(os.environ.get("DIMBRIDGE_WORKERS", 2))
+job_queue_size = int(os.environ.get("DIMBRIDGE_MAX_QUEUE", 16))  # max. unfinished jobs
+job_manager = None  # shares progress and cancellation with the workers
+# job id -> dict(future, progress, cancel), oldest first
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+max_finished_jobs = 256  # finished jobs kept for /get_job
+
+
+def configure_worker(cache_bytes, cache):
+    """Initializer of job_pool workers, which do not see --cache_mb and --result_cache"""
+    global dataset_cache_bytes, result_cache
+    dataset_cache_bytes = cache_bytes
+    result_cache = cache
+
+
+def run_predicate_job(params, progress, cancel):
+    """
+    Body of a predicate job, in a worker process.
+    progress (a shared dict) and cancel (a shared Event) are proxies to the job manager,
+    so they are updated and polled at most every 0.1 s rather than on every iteration
+    """
+    last = dict(progress=0.0, cancel=0.0)
+
+    def report(state):
+        now = time.perf_counter()
+        if now - last["progress"] > 0.1:
+            progress.update(state)
+            last["progress"] = now
+
+    def is_cancelled():
+        now = time.perf_counter()
+        if now - last["cancel"] > 0.1:
+            last["cancel"] = now
+            return cancel.is_set()
+        return False
+
+    progress["status"] = "running"
+    return compute_predicates(params, is_cancelled=is_cancelled, progress=report)
+
+
+def job_status(job):
+    """Status of a job: queued, running, done, failed or cancelled, with its progress or result"""
+    future = job["future"]
+    status = dict(progress=dict(job["progress"]))
+    if future.cancelled():
+        status["status"] = "cancelled"
+    elif not future.done():
+        status["status"] = status["progress"].pop("status", "queued")
+    elif isinstance(future.exception(), Cancelled):
+        status["status"] = "cancelled"
+    elif future.exception() is not None:
+        status["status"] = "failed"
+        status["error"] = repr(future.exception())
+    else:
+        status["status"] = "done"
+        status["result"] = future.result()
+    status["progress"].pop("status", None)
+    return status
+
+
+@app.route("/submit_predicates", methods=["POST"])
+def submit_predicates():
+    """
+    Queue a predicate computation with the same request body as /get_predicates.
+    Returns dict(job_id), or status 429 when job_queue_size jobs are already unfinished
+    """
+    global job_pool, job_manager
+    with jobs_lock:
+        if job_pool is None:
+            context = multiprocessing.get_context("spawn")
+            job_pool = ProcessPoolExecutor(
+                job_pool_workers,
+                mp_context=context,
+                initializer=configure_worker,
+                initargs=(dataset_cache_bytes, result_cache),
+            )
+            job_manager = context.Manager()
+        n_unfinished = sum(not job["future"].done() for job in jobs.values())
+        if n_unfinished >= job_queue_size:
+            return dict(error="too many jobs, try again later"), 429
+        # forget the oldest finished jobs
+        finished = [job_id for job_id, job in jobs.items() if job["future"].done()]
+        for job_id in finished[: max(0, len(finished) - max_finished_jobs + 1)]:
+            del jobs[job_id]
+
+        job_id = uuid.uuid4().hex
+        progress = job_manager.dict(
+            n_iter=0, n_iter_max=request.json.get("n_iter", 1000)
+        )
+        cancel = job_manager.Event()
+        future = job_pool.submit(run_predicate_job, request.json, progress, cancel)
+        jobs[job_id] = dict(future=future, progress=progress, cancel=cancel)
+    return dict(job_id=job_id)
+
+
+@app.route("/get_job/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Status of a job submitted to /submit_predicates:
+    dict(status, progress=dict(n_iter, n_iter_max, loss)),
+    plus result (as returned by /get_predicates) when done, or error when failed
+    """
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        return dict(error=f"unknown job {job_id}"), 404
+    return job_status(job)
+
+
+@app.route("/cancel_job/<job_id>", methods=["POST"])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        return dict(error=f"unknown job {job_id}"), 404
+    if not job["future"].cancel():
+        job["cancel"].set()  # already running: stop at the next cancellation check
+    return job_status(job)
+
+
+@app.route("/get_cache_stats", methods=["GET"])
+def get_cache_stats():
+    """Hit, miss and eviction counts of the dataset cache, and what it holds"""
+    with dataset_cache_lock:
+        stats = dict(
+            dataset_cache_stats,
+            datasets=list(dataset_cache),
+            nbytes=sum(dataset_nbytes(e) for e in dataset_cache.values()),
+            budget_bytes=dataset_cache_bytes,
+        )
+    if result_cache is not None:
+        # hits and misses of this process (jobs count theirs in the job_pool workers)
+        stats["result_cache"] = dict(
+            result_cache.stats,
+            directory=result_cache.directory,
+            nbytes=result_cache.nbytes,
+            budget_bytes=result_cache.max_bytes,
+        )
+    return stats
+
+
 # embedding = None
 # @app.route('/get_embedding', methods=['GET'])
 # def get_embedding():
@@ -364,9 +474,58 @@ if __name__ == "__main__":
     )
     parser.add_argument("-p", "--port", default=9001, help="App running port")
     parser.add_argument("--debug", default=False, help="Turn on Flask debug mode")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=job_pool_workers,
+        help="Number of worker processes of predicate jobs (or set DIMBRIDGE_WORKERS)",
+    )
+    parser.add_argument(
+        "--max_queue",
+        type=int,
+        default=job_queue_size,
+        help="Max. number of unfinished predicate jobs (or set DIMBRIDGE_MAX_QUEUE)",
+    )
+    parser.add_argument(
+        "--convert",
+        nargs="+",
+        metavar="DATASET",
+        help="Convert the csv of these datasets (or 'all') to memory-mappable column files, and exit",
+    )
+    parser.add_argument(
+        "--cache_mb",
+        type=float,
+        default=dataset_cache_bytes / 2**20,
+        help="Memory budget of the dataset cache in MB (or set DIMBRIDGE_CACHE_MB)",
+    )
+    parser.add_argument(
+        "--result_cache",
+        default=os.environ.get("DIMBRIDGE_RESULT_CACHE"),
+        metavar="DIRECTORY",
+        help="Directory of a persistent cache of predicate results (or set DIMBRIDGE_RESULT_CACHE)",
+    )
+    parser.add_argument(
+        "--result_cache_mb",
+        type=float,
+        default=float(os.environ.get("DIMBRIDGE_RESULT_CACHE_MB", 1024)),
+        help="Size cap of the result cache in MB (or set DIMBRIDGE_RESULT_CACHE_MB)",
+    )
 
     args = parser.parse_args()
     print("Running App under arguments: ", args)
+    if args.convert:
+        datasets = args.convert
+        if datasets == ["all"]:
+            datasets = get_dataset_names()
+        for dataset in datasets:
+            print("converting", dataset)
+            convert_dataset(dataset)
+        raise SystemExit()
+    dataset_cache_bytes = int(args.cache_mb * 2**20)
+    if args.result_cache:
+        result_cache = ResultCache(args.result_cache, int(args.result_cache_mb * 2**20))
+    job_pool_workers = args.workers
+    job_queue_size = args.max_queue
     # parser.add_argument(
     #     '--embedding_fn',
     #     required=True,
@@ -0,0 +1,61 @@
+"""
+Compare two result files of benchmarks/suite.py.
+Prints the minimum wall time of every benchmark present in both files
+(and the peak RSS of engine benchmarks, when both files have it),
+and flags the ones that got slower by more than --threshold.
+
+Usage:
+    python benchmarks/compare.py benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(filename):
+    with open(filename) as f:
+        results = json.load(f)
+    return results["meta"], {r["name"]: r for r in results["results"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/compare.py",
+        description="Compare two benchmark result files",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.1,
+        help="new/old time ratio above which a benchmark counts as a regression",
+    )
+    args = parser.parse_args()
+
+    old_meta, old = load(args.old)
+    new_meta, new = load(args.new)
+    print(f"old: {old_meta['commit']} {old_meta['timestamp']}")
+    print(f"new: {new_meta['commit']} {new_meta['timestamp']}")
+    names = [name for name in new if name in old]
+    width = max([len(name) for name in names], default=4)
+    print(f"{'name':<{width}} {'old(s)':>10} {'new(s)':>10} {'ratio':>7}")
+    n_regressions = 0
+    for name in names:
+        ratio = new[name]["min"] / max(old[name]["min"], 1e-12)
+        flag = ""
+        if ratio > args.threshold:
+            flag = " slower"
+            n_regressions += 1
+        if "peak_rss_mb" in old[name] and "peak_rss_mb" in new[name]:
+            flag += f" (peak RSS {old[name]['peak_rss_mb']:.0f} -> {new[name]['peak_rss_mb']:.0f} MB)"
+        print(
+            f"{name:<{width}} {old[name]['min']:>10.4f} {new[name]['min']:>10.4f} {ratio:>7.2f}{flag}"
+        )
+    missing = sorted(set(old) ^ set(new))
+    if missing:
+        print(f"{len(missing)} benchmarks are in only one of the files")
+    # non-zero exit status on regressions, e.g., for CI
+    sys.exit(1 if n_regressions else 0)
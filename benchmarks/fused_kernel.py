@@ -0,0 +1,108 @@
+"""
+Check the fused bump/BCE kernel (engine="fused") against torch autograd,
+and compare CPU time and peak memory of both engines on wide data.
+
+Usage:
+    python benchmarks/fused_kernel.py --n_points 100000 --n_features 100 --n_brushes 12
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+
+def check_gradients(n_points=500, n_features=7, n_brushes=3, seed=0):
+    """Max relative difference between fused and autograd loss/gradients, in float64"""
+    import torch
+
+    from dimbridge.predicate_engine import predict_batch
+    from dimbridge.torch_engine import FusedBumpBCE
+
+    torch.manual_seed(seed)
+    x = torch.randn(n_points, n_features, dtype=torch.float64)
+    a = torch.randn(n_brushes, n_features, dtype=torch.float64, requires_grad=True)
+    mu = (
+        0.3 * torch.randn(n_brushes, n_features, dtype=torch.float64)
+    ).requires_grad_()
+    label = (torch.rand(n_brushes, n_points) < 0.3).double()
+    weight = torch.rand(n_brushes, n_points, dtype=torch.float64)
+    grad_output = torch.randn(n_brushes, dtype=torch.float64)
+
+    fused = FusedBumpBCE.apply(x, a, mu, label, weight)
+    fused_grads = torch.autograd.grad((fused * grad_output).sum(), [a, mu])
+    autograd = torch.nn.functional.binary_cross_entropy(
+        predict_batch(x, a, mu), label, weight=weight, reduction="none"
+    ).sum(1)
+    autograd_grads = torch.autograd.grad((autograd * grad_output).sum(), [a, mu])
+
+    def rel(u, v):
+        return ((u - v).abs().max() / v.abs().max()).item()
+
+    return dict(
+        loss=rel(fused, autograd),
+        grad_a=rel(fused_grads[0], autograd_grads[0]),
+        grad_mu=rel(fused_grads[1], autograd_grads[1]),
+    )
+
+
+def measure(engine, n_points, n_features, n_brushes, n_iter):
+    """Run one engine in this (fresh) process; return wall time and peak RSS in MB"""
+    from dimbridge.predicate_engine import compute_predicate_sequence
+
+    rng = np.random.default_rng(0)
+    x0 = rng.normal(size=(n_points, n_features))
+    centers = np.linspace(-1, 1, n_brushes)
+    selected = np.stack(
+        [(np.abs(x0[:, 0] - c) < 0.5) & (np.abs(x0[:, 1]) < 0.7) for c in centers]
+    )
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        tic = time.perf_counter()
+        compute_predicate_sequence(
+            x0,
+            selected,
+            attribute_names=[f"x{k}" for k in range(n_features)],
+            n_iter=n_iter,
+            tol=None,
+            engine=engine,
+        )
+        elapsed = time.perf_counter() - tic
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, rss_before, rss_after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/fused_kernel.py",
+        description="Compare the fused and autograd predicate engines",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--n_points", type=int, default=100000)
+    parser.add_argument("--n_features", type=int, default=100)
+    parser.add_argument("--n_brushes", type=int, default=12)
+    parser.add_argument("--n_iter", type=int, default=20)
+    args = parser.parse_args()
+
+    print("max relative difference to autograd (float64):", check_gradients())
+
+    # each engine runs in a fresh process so that peak RSS is not shared
+    ctx = multiprocessing.get_context("spawn")
+    print(
+        f"{'engine':>10} {'time(s)':>9} {'peak RSS (MB)':>14} {'training RSS (MB)':>18}"
+    )
+    for engine in ["autograd", "fused"]:
+        with ctx.Pool(1) as pool:
+            elapsed, rss_before, rss_after = pool.apply(
+                measure,
+                (engine, args.n_points, args.n_features, args.n_brushes, args.n_iter),
+            )
+        print(
+            f"{engine:>10} {elapsed:>9.2f} {rss_after:>14.0f} {rss_after - rss_before:>18.0f}"
+        )
@@ -0,0 +1,59 @@
+"""
+Import time and memory of the dimbridge package, and whether torch gets imported.
+Each measurement runs in a fresh interpreter.
+
+Usage:
+    python benchmarks/import_cost.py --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MEASURE = """
+import json, resource, sys, time
+tic = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - tic
+print(json.dumps(dict(
+    time=elapsed,
+    max_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    torch_imported="torch" in sys.modules,
+)))
+"""
+
+
+def measure(module):
+    """Import `module` in a fresh interpreter; return its import time, peak RSS and whether torch was imported"""
+    out = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/import_cost.py",
+        description="Measure the import cost of dimbridge",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--modules",
+        nargs="+",
+        default=["dimbridge", "dimbridge.predicate_engine", "torch"],
+    )
+    args = parser.parse_args()
+
+    print(f"{'module':>28} {'time(s)':>9} {'peak RSS (MB)':>14} {'torch':>6}")
+    for module in args.modules:
+        results = [measure(module) for _ in range(args.repeat)]
+        # the fastest run is the least disturbed by other processes
+        best = min(results, key=lambda r: r["time"])
+        print(
+            f"{module:>28} {best['time']:>9.2f} {best['max_rss_mb']:>14.0f} {str(best['torch_imported']):>6}"
+        )
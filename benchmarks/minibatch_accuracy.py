@@ -0,0 +1,111 @@
+"""
+Accuracy vs. speed of minibatch training against full-batch training
+in compute_predicate_sequence on synthetic data.
+
+Usage:
+    python benchmarks/minibatch_accuracy.py --sizes 1e5 1e6 1e7
+
+Results with the defaults (2 brushes, single CPU core, 5 GB of RAM):
+
+      n_points       mode  n_iter   time(s)      f1 precision  recall
+        100000       full     450      6.22   0.558     0.390   0.983
+        100000  minibatch    1000      3.73   0.557     0.388   0.984
+       1000000       full     452    100.82   0.555     0.387   0.984
+       1000000  minibatch     630     42.32   0.555     0.387   0.984
+      10000000       full     451    887.98   0.557     0.388   0.984
+      10000000  minibatch     454    378.98   0.557     0.388   0.984
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from dimbridge.predicate_engine import compute_predicate_sequence
+
+
+def make_dataset(n, n_noise_features=4, seed=0):
+    """
+    Möbius-like 4D data (as in the README example) plus noise features.
+    Returns data x0 and 2D 'projection' coordinates (u, v) used for brushing.
+    """
+    rng = np.random.default_rng(seed)
+    R, P, eps = 2, 3, 0.5
+    u = rng.random(n) * np.pi * 2
+    v = rng.random(n) * np.pi * 2
+    columns = [
+        R * (np.cos(u / 2) * np.cos(v) - np.sin(u / 2) * np.sin(2 * v)),
+        R * (np.sin(u / 2) * np.cos(v) + np.cos(u / 2) * np.sin(2 * v)),
+        P * np.cos(u) * (1 + eps * np.sin(v)),
+        P * np.sin(u) * (1 + eps * np.sin(v)),
+    ]
+    columns += [rng.normal(size=n) for _ in range(n_noise_features)]
+    return np.stack(columns, 1), np.c_[u, v]
+
+
+def make_brushes(uv, n_brushes):
+    """Rectangular brushes along a horizontal stroke in the (u, v) plane"""
+    centers = np.linspace(1.5, 4.5, n_brushes)
+    return np.stack(
+        [
+            (np.abs(uv[:, 0] - c) < 0.5) & (np.abs(uv[:, 1] - np.pi) < 0.8)
+            for c in centers
+        ]
+    )
+
+
+def run(x0, selected, return_parameters=False, **kwargs):
+    # silence the progress bar and quality printout
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        tic = time.perf_counter()
+        predicates, qualities, parameters, info = compute_predicate_sequence(
+            x0,
+            selected,
+            attribute_names=[f"x{k}" for k in range(x0.shape[1])],
+            **kwargs,
+        )
+        elapsed = time.perf_counter() - tic
+    if return_parameters:
+        return qualities, info, elapsed, parameters
+    return qualities, info, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/minibatch_accuracy.py",
+        description="Compare minibatch and full-batch predicate regression",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e5, 1e6, 1e7])
+    parser.add_argument("--n_brushes", type=int, default=2)
+    parser.add_argument("--n_iter", type=int, default=1000)
+    parser.add_argument(
+        "--skip_full_above",
+        type=float,
+        default=None,
+        help="skip the (slow) full-batch run for datasets larger than this",
+    )
+    args = parser.parse_args()
+
+    header = f"{'n_points':>10} {'mode':>10} {'n_iter':>7} {'time(s)':>9} {'f1':>7} {'precision':>9} {'recall':>7}"
+    print(header)
+    for n in args.sizes:
+        n = int(n)
+        x0, uv = make_dataset(n)
+        selected = make_brushes(uv, args.n_brushes)
+        modes = [("minibatch", dict(minibatch=True))]
+        if args.skip_full_above is None or n <= args.skip_full_above:
+            modes.insert(0, ("full", dict(minibatch=False)))
+        for mode, kwargs in modes:
+            qualities, info, elapsed = run(x0, selected, n_iter=args.n_iter, **kwargs)
+            f1 = np.mean([q["f1"] for q in qualities])
+            precision = np.mean([q["precision"] for q in qualities])
+            recall = np.mean([q["recall"] for q in qualities])
+            print(
+                f"{n:>10} {mode:>10} {info['n_iter']:>7} {elapsed:>9.2f} {f1:>7.3f} {precision:>9.3f} {recall:>7.3f}",
+                flush=True,
+            )
@@ -0,0 +1,90 @@
+"""
+Peak memory and wall time of compute_predicate_sequence in memory (prepare_data)
+and out of core (chunk_size=..., over a memory-mapped .npy file), for several chunk sizes.
+
+Peak memory is measured in a fresh process per run, as the peak of memory allocated by
+Python and NumPy (tracemalloc), which excludes the pages of the memory-mapped file
+(those count towards RSS, but the OS can drop them under memory pressure).
+
+Usage:
+    python benchmarks/out_of_core.py --n_points 5000000 --chunk_size 16384 65536 262144
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from minibatch_accuracy import make_dataset
+
+
+def measure(filename, chunk_size, n_brushes, n_iter):
+    """Run one configuration in this (fresh) process; return wall time, peak MB and loss"""
+    from dimbridge.predicate_engine import compute_predicate_sequence
+
+    x0 = np.load(filename, mmap_mode="r")
+    if chunk_size is None:
+        x0 = np.array(x0)  # in memory
+    # brushes along the first (u-like) column, as in the suite's curve mode
+    centers = np.linspace(-0.5, 0.5, n_brushes)
+    tracemalloc.start()
+    selected = np.stack([np.abs(x0[:, 0] - c) < 0.2 for c in centers])
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        tic = time.perf_counter()
+        info = compute_predicate_sequence(
+            x0,
+            selected,
+            attribute_names=[f"x{k}" for k in range(x0.shape[1])],
+            n_iter=n_iter,
+            tol=None,
+            chunk_size=chunk_size,
+        )[3]
+        elapsed = time.perf_counter() - tic
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, info["loss"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/out_of_core.py",
+        description="Peak memory of in-memory and out-of-core predicate regression",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--n_points", type=int, default=2000000)
+    parser.add_argument("--n_features", type=int, default=8)
+    parser.add_argument("--n_brushes", type=int, default=2)
+    parser.add_argument("--n_iter", type=int, default=10)
+    parser.add_argument(
+        "--chunk_size", type=int, nargs="+", default=[16384, 65536, 262144]
+    )
+    args = parser.parse_args()
+
+    x0, _ = make_dataset(args.n_points, n_noise_features=args.n_features - 4)
+    print(f"data: {x0.shape}, {x0.nbytes / 2**20:.0f} MB ({x0.dtype})")
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as root:
+        filename = os.path.join(root, "x0.npy")
+        np.save(filename, x0)
+        del x0
+        print(
+            f"{'mode':>12} {'chunk_size':>10} {'time(s)':>8} {'peak (MB)':>10} {'loss':>8}"
+        )
+        for chunk_size in [None] + args.chunk_size:
+            # each run in a fresh process so that peaks are not shared
+            with ctx.Pool(1) as pool:
+                elapsed, peak, loss = pool.apply(
+                    measure, (filename, chunk_size, args.n_brushes, args.n_iter)
+                )
+            mode = "in memory" if chunk_size is None else "out of core"
+            print(
+                f"{mode:>12} {chunk_size or '':>10} {elapsed:>8.2f} {peak:>10.0f} {loss:>8.4f}"
+            )
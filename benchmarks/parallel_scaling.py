@@ -0,0 +1,99 @@
+"""
+Strong scaling of the data-parallel engine (engine="parallel") from 1 to N worker processes,
+against the single-process NumPy engine, on one large dataset (5M rows by default).
+Reports the time of one full-batch loss and gradient evaluation (one SGD step),
+the speedup and parallel efficiency, and the start-up time of each worker pool.
+
+Usage:
+    python benchmarks/parallel_scaling.py                       # 1, 2, 4, ... cpu_count workers
+    python benchmarks/parallel_scaling.py --workers 1 2 4 8 16
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+from minibatch_accuracy import make_dataset
+
+
+def step_times(engine, a, mu, repeat):
+    """Wall times in seconds of `repeat` full-batch loss_and_grad calls"""
+    times = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        engine.loss_and_grad(a, mu)
+        times.append(time.perf_counter() - tic)
+    return times
+
+
+if __name__ == "__main__":
+    n_cores = os.cpu_count() or 1
+    default_workers = sorted(
+        {2**k for k in range(n_cores.bit_length()) if 2**k <= n_cores} | {n_cores}
+    )
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/parallel_scaling.py",
+        description="Scaling of the data-parallel predicate engine across CPU cores",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--n_points", type=int, default=5000000)
+    parser.add_argument("--n_features", type=int, default=8)
+    parser.add_argument("--n_brushes", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    args = parser.parse_args()
+
+    from dimbridge.parallel_engine import ShardedEngine
+    from dimbridge.predicate_engine import NumpyEngine, prepare_data
+
+    x0, uv = make_dataset(args.n_points, n_noise_features=args.n_features - 4)
+    centers = np.linspace(1.5, 4.5, args.n_brushes)
+    selected = np.stack(
+        [
+            (np.abs(uv[:, 0] - c) < 0.5) & (np.abs(uv[:, 1] - np.pi) < 0.8)
+            for c in centers
+        ]
+    )
+    prepared = prepare_data(x0)
+    x = prepared["x"]
+    n_selected = selected.sum(1)
+    weight_selected = args.n_points / n_selected
+    weight_unselected = 2 * args.n_points / (args.n_points - n_selected)
+    a = 1 / np.stack([x[s].std(0, ddof=1) for s in selected]).astype(np.float64)
+    mu = np.stack([x[s].mean(0) for s in selected]).astype(np.float64)
+    print(
+        f"{args.n_points} x {args.n_features}, {args.n_brushes} brushes, "
+        f"{n_cores} CPU cores"
+    )
+
+    engine = NumpyEngine(prepared, selected, weight_selected, weight_unselected)
+    reference = engine.loss_and_grad(a, mu)
+    baseline = statistics.median(step_times(engine, a, mu, args.repeat))
+    print(
+        f"{'engine':>10} {'workers':>8} {'start(s)':>9} {'step(s)':>8} {'speedup':>8} {'efficiency':>11} {'max rel. diff':>14}"
+    )
+    print(
+        f"{'numpy':>10} {1:>8} {'':>9} {baseline:>8.3f} {1:>8.2f} {1:>11.2f} {'':>14}"
+    )
+    for n_workers in args.workers:
+        tic = time.perf_counter()
+        engine = ShardedEngine.with_workers(n_workers)(
+            prepared, selected, weight_selected, weight_unselected
+        )
+        start = time.perf_counter() - tic
+        result = engine.loss_and_grad(a, mu)
+        diff = max(
+            np.abs(u - v).max() / max(np.abs(v).max(), 1e-12)
+            for u, v in zip(result, reference)
+        )
+        step = statistics.median(step_times(engine, a, mu, args.repeat))
+        print(
+            f"{'parallel':>10} {n_workers:>8} {start:>9.2f} {step:>8.3f} "
+            f"{baseline / step:>8.2f} {baseline / step / min(n_workers, n_cores):>11.2f} {diff:>14.1e}"
+        )
+        # shut the workers down before starting the next pool
+        engine.close()
+        prepared.pop(f"shard_pool_{n_workers}").close()
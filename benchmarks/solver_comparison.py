@@ -0,0 +1,64 @@
+"""
+Loss evaluations to convergence and wall time of the SGD and L-BFGS solvers
+of compute_predicate_sequence, on the README's Möbius example and larger synthetic sets.
+
+Usage:
+    python benchmarks/solver_comparison.py
+"""
+
+import argparse
+
+import numpy as np
+
+from minibatch_accuracy import make_brushes, make_dataset, run
+
+CASES = [
+    # name, n_points, n_noise_features, n_brushes
+    ("readme single", 10000, 0, 1),
+    ("readme curve", 10000, 0, 5),
+    ("synthetic", 100000, 4, 3),
+    ("synthetic wide", 50000, 46, 3),
+    ("synthetic large", 1000000, 4, 2),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/solver_comparison.py",
+        description="Compare the SGD and L-BFGS solvers of predicate regression",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--n_iter", type=int, default=1000)
+    parser.add_argument("--tol", type=float, default=1e-4)
+    parser.add_argument(
+        "--max_points",
+        type=float,
+        default=None,
+        help="skip the cases with more points than this",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'case':>16} {'shape':>14} {'solver':>7} {'n_iter':>7} {'n_eval':>7} {'time(s)':>8} {'loss':>8} {'f1':>6} {'warm n_eval':>12} {'warm time(s)':>13}"
+    )
+    for name, n, n_noise, n_brushes in CASES:
+        if args.max_points is not None and n > args.max_points:
+            continue
+        x0, uv = make_dataset(n, n_noise_features=n_noise)
+        selected = make_brushes(uv, n_brushes)
+        # a slightly moved brush, warm-started from the previous result
+        moved = make_brushes(uv + [0.1, 0], n_brushes)
+        for solver in ["sgd", "lbfgs"]:
+            kwargs = dict(solver=solver, n_iter=args.n_iter, tol=args.tol)
+            qualities, info, elapsed, parameters = run(
+                x0, selected, return_parameters=True, **kwargs
+            )
+            warm_start = [
+                dict(a=a, mu=mu) for a, mu in zip(parameters["a"], parameters["mu"])
+            ]
+            _, warm_info, warm_elapsed = run(x0, moved, warm_start=warm_start, **kwargs)
+            f1 = np.mean([q["f1"] for q in qualities])
+            print(
+                f"{name:>16} {str(x0.shape):>14} {solver:>7} {info['n_iter']:>7} {info['n_eval']:>7} {elapsed:>8.2f} {info['loss']:>8.4f} {f1:>6.3f} {warm_info['n_eval']:>12} {warm_elapsed:>13.2f}",
+                flush=True,
+            )
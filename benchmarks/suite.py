@@ -0,0 +1,406 @@
+"""
+Benchmark suite of the predicate engine, the widget serializers and the Flask app.
+Runs offline on CPU with seeded synthetic data, and writes one JSON file of results
+that benchmarks/compare.py can compare between versions.
+
+Benchmarks:
+- engine: compute_predicate_sequence across n_points, n_features and brush modes
+  (single: 1 brush, contrastive: 2 brushes, curve: a sequence of brushes),
+  with the peak resident memory (RSS) of one run of each case in a fresh process
+- serialization: pandas2json, numpy2json and selection2json/json2selection
+- flask: /get_predicates round trip through the Flask test client (app.py)
+
+Usage:
+    python benchmarks/suite.py                      # full grid
+    python benchmarks/suite.py --quick              # small grid, for a smoke test
+    python benchmarks/suite.py --only engine flask  # a subset of the benchmarks
+    python benchmarks/suite.py --no-memory          # skip the peak memory runs
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from minibatch_accuracy import make_dataset
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# brush modes of the widget and the number of brushes the front end sends in each
+BRUSH_MODES = dict(single=1, contrastive=2, curve=8)
+
+
+def make_case(n_points, n_features, mode, seed=0):
+    """
+    Seeded Möbius data with n_features columns (4 + noise),
+    and brushes laid out as in the given brush mode, in the (u, v) plane
+    """
+    x0, uv = make_dataset(n_points, n_noise_features=n_features - 4, seed=seed)
+    n_brushes = BRUSH_MODES[mode]
+    if mode == "contrastive":
+        # two disjoint rectangles
+        centers = [1.5, 4.5]
+    else:
+        centers = np.linspace(1.5, 4.5, n_brushes)
+    selected = np.stack(
+        [
+            (np.abs(uv[:, 0] - c) < 0.5) & (np.abs(uv[:, 1] - np.pi) < 0.8)
+            for c in centers
+        ]
+    )
+    return x0, uv, selected
+
+
+def timeit(fn, repeat, number=1):
+    """
+    Wall times in seconds per call of fn, with its stdout and stderr silenced.
+    Each of the `repeat` measurements averages `number` consecutive calls
+    """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            tic = time.perf_counter()
+            for _ in range(number):
+                fn()
+            times.append((time.perf_counter() - tic) / number)
+    return times
+
+
+def summarize(name, benchmark, params, times, **extra):
+    return dict(
+        name=name,
+        benchmark=benchmark,
+        params=params,
+        times=times,
+        min=min(times),
+        median=statistics.median(times),
+        **extra,
+    )
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None where it is not available"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def engine_memory(n_points, n_features, mode, n_iter):
+    """
+    Peak RSS in MB of one engine case, run in this (fresh) process:
+    data_rss_mb - after generating and preparing the data,
+    peak_rss_mb - after compute_predicate_sequence,
+    training_rss_mb - the difference, memory used by training beyond the data
+    """
+    from dimbridge.predicate_engine import compute_predicate_sequence, prepare_data
+
+    x0, _, selected = make_case(n_points, n_features, mode)
+    prepared = prepare_data(x0)
+    data_rss = peak_rss_mb()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        compute_predicate_sequence(
+            x0,
+            selected,
+            attribute_names=[f"x{k}" for k in range(n_features)],
+            n_iter=n_iter,
+            tol=None,
+            prepared=prepared,
+        )
+    peak_rss = peak_rss_mb()
+    if peak_rss is None:
+        return {}
+    return dict(
+        data_rss_mb=data_rss,
+        peak_rss_mb=peak_rss,
+        training_rss_mb=peak_rss - data_rss,
+    )
+
+
+def bench_engine(grid, repeat, n_iter, memory=True):
+    from dimbridge.predicate_engine import compute_predicate_sequence, prepare_data
+
+    ctx = multiprocessing.get_context("spawn")
+
+    results = []
+    for n_points in grid["n_points"]:
+        for n_features in grid["n_features"]:
+            for mode in grid["modes"]:
+                x0, _, selected = make_case(n_points, n_features, mode)
+                prepared = prepare_data(x0)
+                # fixed number of iterations (no early stopping),
+                # so that timings are comparable between versions
+                info = {}
+
+                def run():
+                    info.update(
+                        compute_predicate_sequence(
+                            x0,
+                            selected,
+                            attribute_names=[f"x{k}" for k in range(n_features)],
+                            n_iter=n_iter,
+                            tol=None,
+                            prepared=prepared,
+                        )[3]
+                    )
+
+                times = timeit(run, repeat)
+                params = dict(
+                    n_points=n_points,
+                    n_features=n_features,
+                    mode=mode,
+                    n_brushes=len(selected),
+                    n_iter=n_iter,
+                )
+                rss = {}
+                if memory:
+                    # the peak RSS of a process never decreases,
+                    # so each case is measured in a process of its own
+                    with ctx.Pool(1) as pool:
+                        rss = pool.apply(
+                            engine_memory, (n_points, n_features, mode, n_iter)
+                        )
+                        pool.close()
+                        pool.join()
+                results.append(
+                    summarize(
+                        f"engine/{mode}/n_points={n_points}/n_features={n_features}",
+                        "engine",
+                        params,
+                        times,
+                        time_per_iter=min(times) / max(info["n_iter"], 1),
+                        # phases of the last run, see compute_predicate_sequence
+                        timing=info["timing"],
+                        **rss,
+                    )
+                )
+                line = f"{results[-1]['name']}: {results[-1]['min']:.3f}s"
+                if rss:
+                    line += f" (peak RSS {rss['peak_rss_mb']:.0f} MB, training {rss['training_rss_mb']:.0f} MB)"
+                print(line, flush=True)
+    return results
+
+
+def bench_serialization(grid, repeat):
+    from dimbridge.datautils import (
+        json2selection,
+        numpy2json,
+        pandas2json,
+        selection2json,
+    )
+
+    results = []
+    for n_points in grid["n_points"]:
+        for n_features in grid["n_features"]:
+            x0, uv, selected = make_case(n_points, n_features, "curve")
+            df = pd.DataFrame(x0, columns=[f"x{k}" for k in range(n_features)])
+            cases = [
+                ("pandas2json", lambda: pandas2json(df), pandas2json(df)["data"]),
+                (
+                    "numpy2json",
+                    lambda: numpy2json(uv[:, 0], None),
+                    [numpy2json(uv[:, 0], None)["data"]],
+                ),
+                (
+                    "selection2json",
+                    lambda: selection2json(selected),
+                    [selection2json(selected)["data"]],
+                ),
+                (
+                    "json2selection",
+                    lambda: json2selection(selection2json(selected)),
+                    [selection2json(selected)["data"]],
+                ),
+            ]
+            for fn_name, fn, buffers in cases:
+                if fn_name != "pandas2json" and n_features != grid["n_features"][0]:
+                    continue  # independent of n_features
+                # calls take microseconds to milliseconds,
+                # so each measurement loops for about 0.1s
+                number = max(1, int(0.1 / max(timeit(fn, 1)[0], 1e-7)))
+                times = timeit(fn, repeat, number)
+                params = dict(n_points=n_points, n_features=n_features)
+                results.append(
+                    summarize(
+                        f"serialization/{fn_name}/n_points={n_points}/n_features={n_features}",
+                        "serialization",
+                        params,
+                        times,
+                        number=number,
+                        n_bytes=sum(len(b) for b in buffers),
+                    )
+                )
+                print(f"{results[-1]['name']}: {results[-1]['min']:.5f}s", flush=True)
+    return results
+
+
+def bench_flask(grid, repeat, n_iter):
+    try:
+        import flask  # noqa: F401
+        import flask_cors  # noqa: F401
+    except ImportError as e:
+        print(f"skipping flask benchmarks: {e}")
+        return []
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        # app.py reads ./datasets/<name>/*.csv relative to the working directory
+        os.chdir(root)
+        sys.path.insert(0, REPO_DIR)
+        try:
+            import app
+
+            client = app.app.test_client()
+            for n_points in grid["n_points"]:
+                n_features = grid["n_features"][0]
+                name = f"bench_{n_points}"
+                x0, uv, _ = make_case(n_points, n_features, "single")
+                # datasets carry their 2D projection in columns x and y
+                df = pd.DataFrame(x0, columns=[f"x{k}" for k in range(n_features)])
+                df["x"], df["y"] = uv[:, 0], uv[:, 1]
+                os.makedirs(f"datasets/{name}")
+                df.to_csv(f"datasets/{name}/data.csv", index=False)
+                for mode in grid["modes"]:
+                    _, _, selected = make_case(n_points, n_features, mode)
+                    payload = dict(
+                        dataset=name, subsets=selected.tolist(), n_iter=n_iter, tol=None
+                    )
+
+                    def post():
+                        response = client.post("/get_predicates", json=payload)
+                        assert response.status_code == 200, response.status_code
+
+                    # the first request of a dataset also loads its csv
+                    app.dataset_cache.clear()
+                    cold = timeit(post, 1)
+                    warm = timeit(post, repeat)
+                    params = dict(
+                        n_points=n_points,
+                        n_features=n_features,
+                        mode=mode,
+                        n_brushes=len(selected),
+                        n_iter=n_iter,
+                    )
+                    results.append(
+                        summarize(
+                            f"flask/get_predicates/{mode}/n_points={n_points}/n_features={n_features}",
+                            "flask",
+                            params,
+                            warm,
+                            cold=cold[0],
+                            request_bytes=len(json.dumps(payload)),
+                        )
+                    )
+                    print(
+                        f"{results[-1]['name']}: {results[-1]['min']:.3f}s (cold {cold[0]:.3f}s)",
+                        flush=True,
+                    )
+        finally:
+            sys.path.remove(REPO_DIR)
+            os.chdir(cwd)
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return dict(
+        timestamp=datetime.datetime.now().isoformat(timespec="seconds"),
+        commit=commit,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        pandas=pd.__version__,
+        platform=platform.platform(),
+        processor=platform.processor(),
+        cpu_count=os.cpu_count(),
+        args=vars(args),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/suite.py",
+        description="Benchmark the predicate engine, serializers and Flask app",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=["engine", "serialization", "flask"],
+        default=["engine", "serialization", "flask"],
+    )
+    parser.add_argument("--quick", action="store_true", help="small grid")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--n_iter", type=int, default=50)
+    parser.add_argument(
+        "--memory",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="measure the peak RSS of each engine case (in a fresh process)",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="result file, defaults to benchmarks/results/<timestamp>_<commit>.json",
+    )
+    args = parser.parse_args()
+
+    if args.quick:
+        engine_grid = dict(n_points=[1000, 10000], n_features=[4, 16])
+        serialization_grid = dict(n_points=[10000], n_features=[4, 16])
+        flask_grid = dict(n_points=[1000], n_features=[4])
+    else:
+        engine_grid = dict(n_points=[1000, 10000, 100000], n_features=[4, 16, 64])
+        serialization_grid = dict(
+            n_points=[10000, 100000, 1000000], n_features=[4, 16, 64]
+        )
+        flask_grid = dict(n_points=[1000, 10000, 100000], n_features=[8])
+    for grid in [engine_grid, flask_grid]:
+        grid["modes"] = list(BRUSH_MODES)
+
+    meta = metadata(args)
+    results = []
+    if "engine" in args.only:
+        results += bench_engine(engine_grid, args.repeat, args.n_iter, args.memory)
+    if "serialization" in args.only:
+        results += bench_serialization(serialization_grid, args.repeat)
+    if "flask" in args.only:
+        results += bench_flask(flask_grid, args.repeat, args.n_iter)
+
+    output = args.output
+    if output is None:
+        stamp = meta["timestamp"].replace(":", "").replace("-", "")
+        output = os.path.join(
+            REPO_DIR, "benchmarks", "results", f"{stamp}_{meta['commit']}.json"
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(dict(meta=meta, results=results), f, indent=2)
+    print(f"results written to {output}")
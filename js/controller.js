@@ -39,6 +39,11 @@ export class InteractionController {
         this.splom_view.hide_arrows();
     }
 
+    on_projection_view_refine(predicates) {
+        //intermediate predicates while python is still training (anytime mode)
+        this.predicate_view.draw(predicates, {partial: true});
+    }
+
     on_projection_view_change(predicates, data_size = 1000) {
         //get projection view brush-selected data
         //start predicate computation
@@ -65,7 +70,8 @@ export class InteractionController {
             if (this.predicate_mode === "predicate regression") {
                 // let subplot_limit = 6;
                 splom_attributes = Object.keys(predicates[0]); //.slice(0, subplot_limit);
-            } else if (this.predicate_mode === "data extent") {
+            } else {
+                // "data extent" and "server data extent" predicates include every attribute
                 splom_attributes = this.splom_view.splom_attributes;
             }
 
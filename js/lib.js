@@ -715,6 +715,33 @@ export function scatter_gl(
         });
     };
 
+    res.set_domain = (x_domain, y_domain) => {
+        // zoom: show the region x_domain by y_domain, in data coordinates.
+        // Call redraw (or recolor) afterwards to move the points
+        sx.domain(x_domain);
+        sy.domain(y_domain);
+        sx_gl.domain(x_domain);
+        sy_gl.domain(y_domain);
+        underlay
+            .select(".x-axis")
+            .call(
+                d3
+                    .axisBottom(sx)
+                    .ticks(xticks)
+                    .tickSizeInner(-(height - padding_bottom - padding_top)),
+            );
+        underlay
+            .select(".y-axis")
+            .call(
+                d3
+                    .axisLeft(sy)
+                    .ticks(yticks)
+                    .tickSizeInner(-(width - padding_left - padding_right)),
+            );
+        underlay.selectAll(".tick > line").style("stroke", "#fff");
+        underlay.selectAll("path.domain").style("display", "none");
+    };
+
     //draw
     res.clear();
     res.redraw(data);
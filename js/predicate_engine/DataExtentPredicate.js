@@ -15,9 +15,14 @@ export class DataExtentPredicate {
         this.data = data;
         this.attributes = attributes;
 
-        this.cf = crossfilter(data);
+        this.update_data();
+    }
+
+    update_data() {
+        //(re)build the crossfilter, e.g., after this.data was refilled in place by level of detail
+        this.cf = crossfilter(this.data);
         this.dimensions = Object.fromEntries(
-            attributes.map((a) => {
+            this.attributes.map((a) => {
                 return [a, this.cf.dimension((d) => d[a])];
             }),
         );
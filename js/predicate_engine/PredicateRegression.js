@@ -1,7 +1,7 @@
 import * as d3 from "d3";
 
 import {zip} from "../lib.js";
-import {subsample, get_selected} from "../views/view-utils.js";
+import {subsample, get_brush_geometry} from "../views/view-utils.js";
 import {default as crossfilter} from "https://cdn.skypack.dev/crossfilter2@1.5.4?min";
 
 import {
@@ -36,9 +36,14 @@ export class PredicateRegression {
         );
 
         //init crossfilter
-        this.cf = crossfilter(data);
+        this.update_data();
+    }
+
+    update_data() {
+        //(re)build the crossfilter, e.g., after this.data was refilled in place by level of detail
+        this.cf = crossfilter(this.data);
         this.dimensions = Object.fromEntries(
-            attributes.map((a) => {
+            this.attributes.map((a) => {
                 return [a, this.cf.dimension((d) => d[a])];
             }),
         );
@@ -49,18 +54,9 @@ export class PredicateRegression {
     compute_predicates(brush_history) {
         // let dataset_name = this.model.get("dataset_name");
         // let predicate_host = this.model.get("predicate_host");
-        let selected = brush_history.map((brush_data) => {
-            let sel = get_selected(
-                this.data,
-                brush_data,
-                this.cf,
-                this.dim_x,
-                this.dim_y,
-            );
-            return sel;
-        });
-        //this triggers python's predicate computation and will send a custom message
-        this.model.set("selected", selected);
+        //this triggers python's predicate computation and will send a custom message.
+        //only the brush geometry is sent; python finds the selected points
+        this.model.set("brushes", get_brush_geometry(brush_history));
         this.model.save_changes();
 
         //let response = await fetch_json(`${predicate_host}/get_predicates`, {
@@ -0,0 +1,34 @@
+import * as d3 from "d3";
+
+import {get_brush_geometry} from "../views/view-utils.js";
+
+export class ServerDataExtentPredicate {
+    //Data extent predicates computed by python (dimbridge/extent_engine.py).
+    //Python finds the brushed points from the brush geometry (dimbridge/brushes.py)
+    //and the extent of every attribute from its per-column indexes,
+    //so no crossfilter dimension is built here
+    constructor(data, attributes, model) {
+        console.log("ServerDataExtentPredicate init");
+
+        this.model = model;
+        this.mode = "server data extent";
+        this.data = data;
+        this.attributes = attributes;
+        this.extent = Object.fromEntries(
+            attributes.map((attr) => [
+                attr,
+                d3.extent(this.data, (d) => d[attr]),
+            ]),
+        );
+    }
+
+    update_data() {
+        //nothing to rebuild when level of detail refills this.data: python has every point
+    }
+
+    compute_predicates(brush_history) {
+        //this triggers python's predicate computation and will send the predicates back
+        this.model.set("brushes", get_brush_geometry(brush_history));
+        this.model.save_changes();
+    }
+}
@@ -43,9 +43,21 @@ export default class PredicateView {
         );
         console.log("extent", this.extent);
         this.node = this.init_node();
+        this.set_status_callback();
         return this;
     }
 
+    set_status_callback() {
+        //indicate in the frame title when python is computing predicates
+        this.model.on("change:status", () => {
+            let title =
+                this.model.get("status") === "busy"
+                    ? "Predicate View (computing...)"
+                    : "Predicate View";
+            this.frame_g.select(".frametext").text(title);
+        });
+    }
+
     init_node() {
         let {
             width,
@@ -73,7 +85,7 @@ export default class PredicateView {
             "overflow",
             "visible",
         );
-        frame
+        this.frame_g = frame
             .append("g")
             .call(
                 make_bridge_frame,
@@ -100,17 +112,39 @@ export default class PredicateView {
         return return_node;
     }
 
-    draw(predicates) {
+    draw(predicates, {partial = false} = {}) {
         // Takes predicates data (see first line of code) from projection_view.
         // Renders predicate view depending on brush mode/state indicated by n_boxes
         // For every predicate attribute,
         // when n_boxes=1, predicate view displays a range bar horizontally
         // when n_boxes=2, it displays a _pair_ of categorically colored range bars horizontally
         // when n_boxes>2, it displays a sequence of range bars _vertivally_ as a series of intervals
+        // partial - intermediate predicates (anytime mode). If the current layout has
+        //     the same number of brushes and all their attributes, only the intervals are updated
 
         let n_boxes = predicates.length;
         let attributes = Object.keys(predicates[0]);
 
+        let layout = this.layout;
+        if (
+            partial &&
+            layout !== undefined &&
+            layout.n_boxes === n_boxes &&
+            attributes.every((attr) => layout.attributes.includes(attr))
+        ) {
+            //attributes no longer in the predicates span their whole extent
+            predicates = predicates.map((predicate) =>
+                Object.fromEntries(
+                    layout.attributes.map((attr) => [
+                        attr,
+                        predicate[attr] || this.extent[attr],
+                    ]),
+                ),
+            );
+            this.view_g.draw(predicates, layout.attributes);
+            return;
+        }
+
         //resize height of the overflowed svg
         let subplot_height =
             n_boxes > 2
@@ -167,6 +201,7 @@ export default class PredicateView {
             }
 
             this.view_g.draw(predicates, attributes);
+            this.layout = {n_boxes, attributes};
         }
     }
 }
@@ -69,14 +69,17 @@ export default class ProjectionView {
         this.attributes = Object.keys(data[0]);
 
         this.brush_cf = this.init_brush_crossfilter(data, this.attributes);
-        this.predicate_cf = this.init_predicate_crossfilter(
-            data,
-            this.attributes,
-        );
+        // server data extent mode does not build per-attribute indexes in the browser;
+        // set_pred then checks the predicate intervals point by point
+        this.predicate_cf =
+            predicate_engine.mode === "server data extent"
+                ? null
+                : this.init_predicate_crossfilter(data, this.attributes);
         this.node = this.init_node();
 
         this.draw();
         this.brush = this.init_brush();
+        this.init_zoom();
 
         this.predicate_engine = predicate_engine;
         this.set_predicate_callback();
@@ -89,7 +92,7 @@ export default class ProjectionView {
 
     set_predicate_callback() {
         this.model.on("change:predicates", (event, data) => {
-            let {predicates, qualities} = data;
+            let {predicates, qualities, partial} = data;
             console.log("PREDICATES", predicates);
             //find union of predicate attributes in response.predicates
             let attributes_union = d3
@@ -109,10 +112,17 @@ export default class ProjectionView {
                 }
                 return predicate;
             });
+            if (partial && predicates.length >= 1) {
+                //intermediate predicates of anytime mode:
+                //refine the predicate view in place, restyle points on the final result
+                this.controller.on_projection_view_refine(predicates);
+                return;
+            }
             //update plots
             if (predicates !== undefined && predicates.length >= 1) {
                 //Color scatter plot points by false positives, false negatives, etc.
                 let last_predicate = predicates[predicates.length - 1];
+                this.last_predicate = last_predicate;
                 set_selected(
                     this.data,
                     this.sample_brush_history,
@@ -128,17 +138,17 @@ export default class ProjectionView {
                 );
                 if (this.n_boxes == 1) {
                     if (this.predicate_mode === "data extent") {
-                        update_point_style_gl(this.sca, "confusion");
+                        this.style_points("confusion");
                     } else {
                         //color points by false netagivity, false postivity, etc.
-                        update_point_style_gl(this.sca, "confusion");
+                        this.style_points("confusion");
                     }
                 } else if (this.n_boxes == 2) {
                     //color two sets of points by 2 brush boxes
-                    update_point_style_gl(this.sca, "contrastive");
+                    this.style_points("contrastive");
                 } else {
                     //highligh all selected points by brush curve
-                    update_point_style_gl(this.sca, "brush");
+                    this.style_points("brush");
                 }
                 //inform other views
                 this.controller.on_projection_view_change(predicates);
@@ -295,7 +305,179 @@ export default class ProjectionView {
         return brush;
     }
 
+    init_zoom() {
+        // only with level of detail: python resamples the points of the new viewport,
+        // and update_data draws them (see Dimbridge.viewport)
+        let lod_index = this.model.get("lod_index");
+        let viewport = this.model.get("viewport");
+        if (lod_index === null && viewport.length === 0) {
+            return;
+        }
+        let {sx, sy} = this.sca.scales;
+        let full_domain = [sx.domain(), sy.domain()];
+        let timeout;
+        let set_viewport = (viewport) => {
+            this.model.set("viewport", viewport);
+            this.model.save_changes();
+        };
+        this.sca.overlay.on("wheel", (event) => {
+            event.preventDefault();
+            let [mx, my] = d3.pointer(event, this.sca.overlay.node());
+            let [cx, cy] = [sx.invert(mx), sy.invert(my)];
+            let k = Math.exp(event.deltaY * 0.002); // > 1 zooms out
+            let [x0, x1] = sx.domain().map((v) => cx + (v - cx) * k);
+            let [y0, y1] = sy.domain().map((v) => cy + (v - cy) * k);
+            this.zoom([x0, x1], [y0, y1]);
+            // wait for the end of the wheel gesture before asking for new points
+            clearTimeout(timeout);
+            timeout = setTimeout(() => {
+                set_viewport([
+                    Math.min(x0, x1),
+                    Math.max(x0, x1),
+                    Math.min(y0, y1),
+                    Math.max(y0, y1),
+                ]);
+            }, 300);
+        });
+        this.sca.overlay.on("dblclick", () => {
+            clearTimeout(timeout);
+            this.zoom(...full_domain);
+            set_viewport([]);
+        });
+    }
+
+    zoom(x_domain, y_domain) {
+        //show the current points in the new region until python sends its points
+        this.sca.set_domain(x_domain, y_domain);
+        this.sca.clear();
+        this.redraw_points();
+        this.redraw_brush();
+    }
+
+    update_data({x, y, c}) {
+        //python resampled the points (level of detail) and this.data was refilled in place:
+        //rebuild the crossfilters, and restore the brush and predicate highlights on the new points
+        this.x = x;
+        this.y = y;
+        this.c = c;
+        this.brush_cf = this.init_brush_crossfilter(this.data, this.attributes);
+        if (this.predicate_cf !== null) {
+            this.predicate_cf = this.init_predicate_crossfilter(
+                this.data,
+                this.attributes,
+            );
+        }
+        if (this.sample_brush_history.length > 0) {
+            if (this.n_boxes == 1) {
+                set_selected(
+                    this.data,
+                    this.sample_brush_history,
+                    this.brush_cf,
+                    this.brush_cf_dimensions,
+                );
+            } else if (this.n_boxes == 2) {
+                set_selected_2(
+                    this.data,
+                    this.sample_brush_history,
+                    this.brush_cf,
+                    this.brush_cf_dimensions,
+                );
+            }
+            set_brushed(
+                this.data,
+                this.sample_brush_history,
+                this.brush_cf,
+                this.brush_cf_dimensions,
+            );
+            if (this.last_predicate !== undefined) {
+                set_pred(
+                    this.data,
+                    this.last_predicate,
+                    this.attributes,
+                    this.predicate_cf,
+                    this.predicate_cf_dimensions,
+                );
+            }
+        }
+        this.sca.clear();
+        this.redraw_points();
+    }
+
+    style_points(mode) {
+        //remember the style, so that zoom and update_data can redraw with it
+        this.point_style = mode;
+        update_point_style_gl(this.sca, mode);
+    }
+
+    redraw_points() {
+        if (this.point_style === undefined) {
+            this.sca.redraw(this.data);
+        } else {
+            update_point_style_gl(this.sca, this.point_style);
+        }
+    }
+
+    redraw_brush() {
+        //the brush is kept in data coordinates (brush history): place it in the current scales
+        let {sx, sy} = this.sca.scales;
+        let to_pixels = (b) => {
+            let [x0, x1] = b.x_extent.map(sx);
+            let [y0, y1] = b.y_extent.map(sy);
+            return {
+                ...b,
+                x0,
+                x1,
+                y0,
+                y1,
+                cx: (x0 + x1) / 2,
+                cy: (y0 + y1) / 2,
+                brush_size: 1.2 * Math.sqrt(Math.abs((x0 - x1) * (y0 - y1))),
+            };
+        };
+        if (this.n_boxes == 1) {
+            if (
+                d3.brushSelection(this.g_brush.node()) === null ||
+                this.sample_brush_history.length === 0
+            ) {
+                return;
+            }
+            let b = to_pixels(
+                this.sample_brush_history[this.sample_brush_history.length - 1],
+            );
+            //keep the brush rectangle within the plot
+            let [[ex0, ey0], [ex1, ey1]] = this.brush.extent()();
+            let clamp = (v, lo, hi) => Math.min(Math.max(v, lo), hi);
+            this.g_brush.call(this.brush.move, [
+                [
+                    clamp(Math.min(b.x0, b.x1), ex0, ex1),
+                    clamp(Math.min(b.y0, b.y1), ey0, ey1),
+                ],
+                [
+                    clamp(Math.max(b.x0, b.x1), ex0, ex1),
+                    clamp(Math.max(b.y0, b.y1), ey0, ey1),
+                ],
+            ]);
+        } else {
+            let path = this.g_brush_path.select("path");
+            if (path.empty() || path.attr("display") === "none") {
+                return;
+            }
+            let size =
+                this.n_boxes == 2
+                    ? 0
+                    : to_pixels(this.full_brush_history[0]).brush_size;
+            this.g_brush_path.call(
+                draw_path,
+                this.sample_brush_history.map(to_pixels),
+                {size, "stroke-width": 4},
+            );
+        }
+    }
+
     brush_start(event) {
+        if (!event.sourceEvent) {
+            return; //moved by redraw_brush, not by the user
+        }
         this.full_brush_history = [];
         clear_selected(this.data);
 
@@ -326,6 +508,9 @@ export default class ProjectionView {
     }
 
     async brushed(event) {
+        if (!event.sourceEvent) {
+            return; //moved by redraw_brush, not by the user
+        }
         console.log("brushed n_boxes:", this.n_boxes);
         if (this.n_boxes > 1 && event.mode !== "drag") {
             return;
@@ -386,9 +571,10 @@ export default class ProjectionView {
                     this.brush_cf,
                     this.brush_cf_dimensions,
                 );
+                this.last_predicate = predicates[predicates.length - 1];
                 set_pred(
                     this.data,
-                    predicates[predicates.length - 1],
+                    this.last_predicate,
                     this.attributes,
                     this.predicate_cf,
                     this.predicate_cf_dimensions,
@@ -399,7 +585,7 @@ export default class ProjectionView {
                     this.brush_cf,
                     this.brush_cf_dimensions,
                 );
-                update_point_style_gl(this.sca, "confusion");
+                this.style_points("confusion");
             } else if (this.n_boxes == 2) {
                 set_selected_2(
                     this.data,
@@ -413,7 +599,7 @@ export default class ProjectionView {
                     this.brush_cf,
                     this.brush_cf_dimensions,
                 );
-                update_point_style_gl(this.sca, "contrastive");
+                this.style_points("contrastive");
             } else {
                 set_brushed(
                     this.data,
@@ -421,7 +607,7 @@ export default class ProjectionView {
                     this.brush_cf,
                     this.brush_cf_dimensions,
                 );
-                update_point_style_gl(this.sca, "brush");
+                this.style_points("brush");
             }
             //update other views
             this.controller.on_projection_view_change(
@@ -432,6 +618,9 @@ export default class ProjectionView {
     }
 
     async brush_end(event) {
+        if (!event.sourceEvent) {
+            return; //moved by redraw_brush, not by the user
+        }
         //sync with backend
         //dragging brushed region
         if (this.n_boxes == 1) {
@@ -164,6 +164,7 @@ export default class SplomView {
         if (splom_attributes.length == 0) {
             splom_attributes = this.splom_attributes;
         }
+        this.drawn_with = [splom_attributes, predicates]; //for update_data
         // let { n_boxes, predicates } = projection_view.value;
         let n_boxes = predicates.length;
 
@@ -242,6 +243,16 @@ export default class SplomView {
         }
     }
 
+    update_data() {
+        //level of detail refilled this.data in place: splom_gl2 keeps the points it was
+        //created with, so draw a new SPLOM of the current points, if one was drawn
+        if (this.splom_obj === undefined) {
+            return;
+        }
+        this.splom_obj = undefined;
+        this.draw(...this.drawn_with);
+    }
+
     hide_arrows() {
         if (this.splom_obj == undefined) {
             return;
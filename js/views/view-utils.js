@@ -31,6 +31,19 @@ export function set_pred(
   cf,
   crossfilter_dimensions,
 ) {
+  if (cf === null) {
+    // no crossfilter (server data extent mode): check the intervals point by point,
+    // with the same [lower, upper + 1e-4) bounds as the crossfilter filters below
+    let clauses = all_attributes
+      .filter((attr) => attr in predicate)
+      .map((attr) => [attr, predicate[attr][0], predicate[attr][1] + 1e-4]);
+    data.forEach((d) => {
+      d.pred = clauses.every(
+        ([attr, lower, upper]) => d[attr] >= lower && d[attr] < upper,
+      );
+    });
+    return;
+  }
   let cd = crossfilter_dimensions;
   for (let attr of all_attributes) {
     if (attr in predicate) {
@@ -287,6 +300,34 @@ export function get_selected(data, brush_data, cf, dim_x, dim_y) {
   return data.map((_, i) => cf.isElementFiltered(i));
 }
 
+export function get_brush_geometry(brush_history) {
+  //brush geometry in data coordinates, sent to python instead of per-point selections
+  //(see dimbridge/brushes.py)
+  if (brush_history.length > 2) {
+    //curve mode: boxes of the same size along the brush path
+    let {x_extent, y_extent} = brush_history[0];
+    return {
+      type: "polyline",
+      points: brush_history.map(({x_extent, y_extent}) => [
+        (x_extent[0] + x_extent[1]) / 2,
+        (y_extent[0] + y_extent[1]) / 2,
+      ]),
+      radius: [
+        (x_extent[1] - x_extent[0]) / 2,
+        (y_extent[1] - y_extent[0]) / 2,
+      ],
+    };
+  } else {
+    return {
+      type: "rect",
+      rects: brush_history.map(({x_extent, y_extent}) => [
+        ...x_extent,
+        ...y_extent,
+      ]),
+    };
+  }
+}
+
 export function update_point_style_gl(sca_gl, mode = "confusion") {
   let style = get_point_style(mode);
   let sc = (d, i) => style(d, i).fill;
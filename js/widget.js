@@ -9,6 +9,7 @@ import html2canvas from "html2canvas";
 // custom
 import {DataExtentPredicate} from "./predicate_engine/DataExtentPredicate.js";
 import {PredicateRegression} from "./predicate_engine/PredicateRegression.js";
+import {ServerDataExtentPredicate} from "./predicate_engine/ServerDataExtentPredicate.js";
 
 import ProjectionView from "./views/ProjectionView.js";
 import PredicateView from "./views/PredicateView.js";
@@ -125,39 +126,31 @@ function generatePDF(element, {width = 400, height = 400} = {}) {
     });
 }
 
-function render({model, el}) {
-    console.log("DimBridge render", model, el);
-    console.log("model", model);
-    console.log("el", el);
-    config.cell_width = el.getBoundingClientRect().width;
-    config.width = config.cell_width - 120; // leave some space for fancy frame shadow
-    config.image_view_width = config.width;
-
-    let width = config.width;
-    console.log("UI width", width);
-
-    //get data from python
+function get_points(model, c_extent = undefined) {
+    //decode the points python sends: data rows, projection x and y, and mark colors c.
+    //With level of detail, these are the rows lod_index of the full data.
     let data = pandas2array(model.get("data"));
     let attributes = Object.keys(data[0]);
     let x = numpy2array(model.get("x"));
     let y = numpy2array(model.get("y"));
     let c = numpy2array(model.get("c")); //mark color, array of 3-tuples [r,g,b], or array of numbers
-    let s = model.get("s"); //mark size, array of numbers
-    let image_urls = model.get("image_urls");
-
-    let splom_attributes = model.get("splom_attributes");
+    // rows of the full data shown, null when all of them are (see Dimbridge.lod_max_points)
+    let lod_index = model.get("lod_index");
+    lod_index = lod_index === null ? null : numpy2array(lod_index);
 
     //augment data object
     data.forEach((d, i) => {
         d.x = x[i];
         d.y = y[i];
-        d.index = i;
+        d.index = lod_index ? lod_index[i] : i;
     });
 
     if (typeof c[0] === "number") {
-        //if c is 1-d array, convert scalar values in c to 3-tuple rgb
+        //if c is 1-d array, convert scalar values in c to 3-tuple rgb.
+        //c_extent keeps the color scale of the first points when level of detail resamples them
         let cmap = model.get("cmap");
-        let [vmin, vmax] = d3.extent(c);
+        c_extent = c_extent || d3.extent(c);
+        let [vmin, vmax] = c_extent;
         if (cmap === "viridis") {
             cmap = (x) => d3.interpolateViridis(normalize(x, vmin, vmax));
         } else if (cmap === "set10") {
@@ -167,15 +160,42 @@ function render({model, el}) {
             return hex2rgb(cmap(d));
         });
     }
+    return {data, attributes, x, y, c, c_extent};
+}
 
-    let predicate_mode = model.get("predicate_mode"); // 'data extent' or 'predicate regression'
+function render({model, el}) {
+    console.log("DimBridge render", model, el);
+    console.log("model", model);
+    console.log("el", el);
+    config.cell_width = el.getBoundingClientRect().width;
+    config.width = config.cell_width - 120; // leave some space for fancy frame shadow
+    config.image_view_width = config.width;
+
+    let width = config.width;
+    console.log("UI width", width);
+
+    //get data from python
+    let {data, attributes, x, y, c, c_extent} = get_points(model);
+    let s = model.get("s"); //mark size, array of numbers
+    let image_urls = model.get("image_urls");
+    let splom_attributes = model.get("splom_attributes");
+
+    let predicate_mode = model.get("predicate_mode"); // 'data extent', 'server data extent' or 'predicate regression'
     let brush_mode = model.get("brush_mode"); // 'single', 'contrastive' or 'curve'
 
     // predicate
-    let predicate_engine =
-        predicate_mode === "data extent"
-            ? new DataExtentPredicate(data, attributes)
-            : new PredicateRegression(data, attributes, model);
+    let predicate_engine;
+    if (predicate_mode === "data extent") {
+        predicate_engine = new DataExtentPredicate(data, attributes);
+    } else if (predicate_mode === "server data extent") {
+        predicate_engine = new ServerDataExtentPredicate(
+            data,
+            attributes,
+            model,
+        );
+    } else {
+        predicate_engine = new PredicateRegression(data, attributes, model);
+    }
 
     //init controller
     let controller = new InteractionController(
@@ -233,6 +253,20 @@ function render({model, el}) {
     d3.select(return_node).style("padding", "8px"); // give some space for shadow effects
     el.appendChild(return_node);
 
+    // python resampled the points (zoom, or new data): refill data in place,
+    // so that the controller, the views and the predicate engine all see the new points
+    let on_lod_change = () => {
+        let points = get_points(model, c_extent);
+        data.length = 0;
+        for (let d of points.data) {
+            data.push(d);
+        }
+        predicate_engine.update_data();
+        projection_view.update_data(points);
+        splom_view.update_data();
+    };
+    model.on("change:lod_index", on_lod_change);
+
     // let export_button = d3.create("button").text("export");
     // export_button.on("click", () => {
     //     generatePDF(el);
@@ -251,9 +285,10 @@ function render({model, el}) {
     //     // widget.send({ "type": "my-event", "foo": "bar" })
     //     console.log("custom msg", msg);
     // });
-    // return () => {
-    //     // Optional: Called when the view is destroyed.
-    // };
+    return () => {
+        // Called when the view is destroyed
+        model.off("change:lod_index", on_lod_change);
+    };
 }
 
 export default {
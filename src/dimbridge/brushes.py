@@ -0,0 +1,120 @@
+"""
+Brush geometry sent by the front end (the `brushes` trait of Dimbridge),
+and a uniform grid over the projection that resolves it to selections of points.
+
+Geometry is a dict, in data coordinates of the projection (x, y):
+- dict(type="rect", rects=[[x0, x1, y0, y1], ...]), one rectangle per brush
+  (single and contrastive brush modes)
+- dict(type="polyline", points=[[cx, cy], ...], radius=[rx, ry]), one brush per vertex
+  of the brush path, selecting the points within the box of half-width rx and half-height ry
+  around the vertex (curve brush mode)
+A point selected by [x0, x1, y0, y1] has x0 <= x < x1 and y0 <= y < y1,
+as crossfilter's range filters in the browser.
+"""
+
+import numpy as np
+
+
+def brush_rects(geometry):
+    """Rectangles [x0, x1, y0, y1] of the brushes of a geometry dict, shape [n_brushes, 4]"""
+    if geometry["type"] == "rect":
+        rects = np.asarray(geometry["rects"], dtype=float).reshape(-1, 4)
+    elif geometry["type"] == "polyline":
+        points = np.asarray(geometry["points"], dtype=float).reshape(-1, 2)
+        rx, ry = geometry["radius"]
+        rects = np.stack(
+            [
+                points[:, 0] - rx,
+                points[:, 0] + rx,
+                points[:, 1] - ry,
+                points[:, 1] + ry,
+            ],
+            1,
+        )
+    else:
+        raise ValueError(f"unknown brush geometry type: {geometry['type']!r}")
+    return rects
+
+
+class GridIndex:
+    """
+    Uniform grid over 2D points, with about points_per_cell points per cell on average.
+    Points are sorted by cell (row by row), so that the points of a row of cells
+    form one contiguous range, and a rectangle query reads one range per row of cells
+    it overlaps, instead of every point.
+    Only the points of the cells on the rectangle's border are compared to its bounds;
+    cells strictly inside it are selected as a whole.
+    Rectangles over more than a quarter of the points are resolved by comparing all points,
+    which is faster than scattered writes at that size.
+
+    Parameters
+    ----------
+    x, y - numpy arrays, shape=[n_points]. Point coordinates
+    """
+
+    def __init__(self, x, y, points_per_cell=8):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        n_points = self.x.shape[0]
+        self.n_cells = max(1, int(np.sqrt(n_points / points_per_cell)))
+        finite = np.isfinite(self.x) & np.isfinite(self.y)
+        if finite.any():
+            self.xmin, self.xmax = self.x[finite].min(), self.x[finite].max()
+            self.ymin, self.ymax = self.y[finite].min(), self.y[finite].max()
+        else:
+            self.xmin = self.xmax = self.ymin = self.ymax = 0.0
+        self.cell_width = max(self.xmax - self.xmin, 1e-12) / self.n_cells
+        self.cell_height = max(self.ymax - self.ymin, 1e-12) / self.n_cells
+
+        i = self._cell(self.x, self.xmin, self.cell_width)
+        j = self._cell(self.y, self.ymin, self.cell_height)
+        cell = np.where(finite, j * self.n_cells + i, self.n_cells**2)
+        self.order = np.argsort(cell, kind="stable")
+        # points of cell c are order[start[c] : start[c + 1]]
+        self.start = np.searchsorted(cell[self.order], np.arange(self.n_cells**2 + 1))
+
+    def _cell(self, value, vmin, size):
+        cell = np.floor((value - vmin) / size)
+        return np.clip(np.nan_to_num(cell), 0, self.n_cells - 1).astype(int)
+
+    def select(self, rects):
+        """
+        Points inside each rectangle [x0, x1, y0, y1].
+
+        Returns
+        -------
+        selected - boolean numpy array, shape=[n_rects, n_points]
+        """
+        rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+        selected = np.zeros((rects.shape[0], self.x.shape[0]), dtype=bool)
+        for t, (x0, x1, y0, y1) in enumerate(rects):
+            if not (x0 < x1 and y0 < y1):
+                continue
+            if x1 < self.xmin or x0 > self.xmax or y1 < self.ymin or y0 > self.ymax:
+                continue
+            i0, i1 = self._cell(np.array([x0, x1]), self.xmin, self.cell_width)
+            j0, j1 = self._cell(np.array([y0, y1]), self.ymin, self.cell_height)
+            start = self.start
+            rows = np.arange(j0, j1 + 1) * self.n_cells
+            n_candidates = (start[rows + i1 + 1] - start[rows + i0]).sum()
+            if n_candidates > self.x.shape[0] // 4:
+                x, y = self.x, self.y
+                selected[t] = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+                continue
+            border = []
+            for j in range(j0, j1 + 1):
+                r = j * self.n_cells
+                if j == j0 or j == j1 or i1 - i0 < 2:
+                    border.append(self.order[start[r + i0] : start[r + i1 + 1]])
+                else:
+                    # a cell's index is monotonic in its coordinates,
+                    # so the points of cells i0 < i < i1 are within [x0, x1)
+                    selected[t, self.order[start[r + i0 + 1] : start[r + i1]]] = True
+                    border.append(self.order[start[r + i0] : start[r + i0 + 1]])
+                    border.append(self.order[start[r + i1] : start[r + i1 + 1]])
+            candidates = np.concatenate(border)
+            x = self.x[candidates]
+            y = self.y[candidates]
+            inside = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+            selected[t, candidates[inside]] = True
+        return selected
@@ -1,3 +1,10 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
 def numpy2json(data, widget):
     return dict(
         data=data.tobytes(),
@@ -8,9 +15,119 @@ def numpy2json(data, widget):
 
 def pandas2json(df, widget=None):
     columns = df.columns.to_list()
+    # bool columns are sent as uint8 0/1, which the front end reads as numbers
+    df = df.astype({col: np.uint8 for col in columns if df[col].dtype == bool})
     return dict(
         columns=columns,
         dtypes=[str(dt) for dt in df.dtypes],
         data=[df[col].to_numpy().tobytes() for col in columns],
         shape=[len(df), len(columns)],
     )
+
+
+def json2selection(value, widget=None):
+    """
+    Decode brush selections sent by the front end into a boolean numpy array
+    of shape [n_brushes, n_points].
+    value is either a list of per-point boolean lists, or a binary buffer
+    dict(dtype="bitmask" or "bool", shape=[n_brushes, n_points], data=buffer).
+    Bitmask rows are padded to whole bytes, least significant bit first.
+    """
+    if not isinstance(value, dict):
+        return np.array(value, dtype=bool)
+    n_brushes, n_points = value["shape"]
+    data = np.frombuffer(value["data"], dtype=np.uint8)  # zero-copy view
+    if value["dtype"] == "bitmask":
+        data = data.reshape(n_brushes, -1)
+        return np.unpackbits(data, axis=1, count=n_points, bitorder="little").view(bool)
+    else:
+        return data.view(bool).reshape(n_brushes, n_points)
+
+
+def selection2json(value, widget=None):
+    """Inverse of json2selection: encode a boolean [n_brushes, n_points] array as a bitmask"""
+    selected = np.asarray(value, dtype=bool)
+    if selected.ndim != 2:
+        return []
+    return dict(
+        data=np.packbits(selected, axis=1, bitorder="little").tobytes(),
+        shape=selected.shape,
+        dtype="bitmask",
+    )
+
+
+def save_columns(df, dirname):
+    """
+    Write a DataFrame column-wise under dirname, for memory-mapped loading with load_columns:
+    one .npy file per numeric or boolean column, one JSON list per other column (e.g., strings),
+    and schema.json with the name, dtype ("json" for JSON columns) and file of each column.
+    schema.json is written last, so its presence marks a complete conversion.
+    """
+    os.makedirs(os.path.join(dirname, "columns"), exist_ok=True)
+    schema = dict(n_rows=len(df), columns=[])
+    for j, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        if values.dtype.kind in "biuf":
+            filename = f"columns/{j}.npy"
+            np.save(os.path.join(dirname, filename), np.ascontiguousarray(values))
+            dtype = str(values.dtype)
+        else:
+            filename = f"columns/{j}.json"
+            with open(os.path.join(dirname, filename), "w") as f:
+                json.dump(
+                    [None if pd.isna(v) else v for v in values.tolist()], f, default=str
+                )
+            dtype = "json"
+        schema["columns"].append(dict(name=str(column), dtype=dtype, file=filename))
+    with open(os.path.join(dirname, "schema.json"), "w") as f:
+        json.dump(schema, f, indent=2)
+
+
+def load_columns(dirname, mmap_mode="r"):
+    """
+    Read a dataset written by save_columns.
+
+    Returns
+    -------
+    schema - dict(n_rows, columns=[dict(name, dtype, file)...]), as in schema.json
+    data - dict of column name -> numpy array (memory-mapped unless mmap_mode is None),
+           or list of values for JSON columns
+    """
+    with open(os.path.join(dirname, "schema.json")) as f:
+        schema = json.load(f)
+    data = {}
+    for column in schema["columns"]:
+        filename = os.path.join(dirname, column["file"])
+        if column["dtype"] == "json":
+            with open(filename) as f:
+                data[column["name"]] = json.load(f)
+        else:
+            data[column["name"]] = np.load(filename, mmap_mode=mmap_mode)
+    return schema, data
+
+
+class ColumnStack:
+    """
+    Read-only 2D view of equal-length columns (e.g., the memory-mapped columns of load_columns),
+    shape=[n_rows, n_columns]. Rows are read on indexing, x[start:stop] or x[index_array],
+    so it can be passed as x0 to compute_predicate_sequence(..., chunk_size=...)
+    without loading the dataset in memory.
+    """
+
+    def __init__(self, columns, dtype=np.float32):
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        self.shape = (len(self.columns[0]), len(self.columns))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        if isinstance(rows, slice):
+            n_rows = len(range(*rows.indices(self.shape[0])))
+        else:
+            n_rows = len(rows)
+        out = np.empty((n_rows, self.shape[1]), dtype=self.dtype)
+        for k, column in enumerate(self.columns):
+            out[:, k] = column[rows]
+        return out
@@ -0,0 +1,145 @@
+"""
+Apply predicates to data, and score them against selections.
+A predicate is a list of clauses dict(dim, interval, attribute), as returned by
+compute_predicate_sequence or compute_extent_predicates (the `predicates` of Dimbridge.get_predicate).
+A point satisfies a predicate if it is inside the closed interval of every clause.
+"""
+
+import numpy as np
+
+
+def predicates_to_boxes(predicates, n_features, attribute_names=None):
+    """
+    Bounds of the predicates, with -inf and inf on the attributes they do not constrain.
+
+    predicates - list of n_predicates clause lists
+    n_features - number of columns of the data
+    attribute_names - optional column names of the data. If given, clauses are matched
+          to columns by attribute name, otherwise by dim
+
+    Returns
+    -------
+    vmin, vmax - numpy arrays, shape=[n_predicates, n_features]
+    """
+    vmin = np.full((len(predicates), n_features), -np.inf)
+    vmax = np.full((len(predicates), n_features), np.inf)
+    if attribute_names is not None:
+        columns = {name: k for k, name in enumerate(attribute_names)}
+    for t, predicate in enumerate(predicates):
+        for clause in predicate:
+            if attribute_names is None:
+                k = clause["dim"]
+            else:
+                k = columns[clause["attribute"]]
+            lower, upper = clause["interval"]
+            # repeated clauses on a column intersect
+            vmin[t, k] = max(vmin[t, k], lower)
+            vmax[t, k] = min(vmax[t, k], upper)
+    return vmin, vmax
+
+
+def _qualities(n_points, n_predicted, n_selected, tp):
+    """Qualities in the format of compute_predicate_sequence, from per-predicate counts"""
+    qualities = []
+    for t in range(len(tp)):
+        precision = tp[t] / n_predicted[t] if n_predicted[t] > 0 else 0
+        recall = tp[t] / n_selected[t] if n_selected[t] > 0 else 0
+        f1 = 2 / (1 / precision + 1 / recall) if precision > 0 and recall > 0 else 0
+        errors = n_predicted[t] + n_selected[t] - 2 * tp[t]
+        qualities.append(
+            dict(
+                brush=t,
+                accuracy=float(1 - errors / n_points),
+                precision=float(precision),
+                recall=float(recall),
+                f1=float(f1),
+            )
+        )
+    return qualities
+
+
+def evaluate_predicates(
+    x0,
+    predicates,
+    selected=None,
+    attribute_names=None,
+    index=None,
+    chunk_size=2**16,
+    return_masks=True,
+):
+    """
+    Masks of many predicates over a data set, and their quality against selections, in one pass.
+
+    Without `index`, rows are read in chunks of chunk_size rows, and every predicate
+    is checked on a chunk before reading the next one, so x0 can be a memory-mapped array
+    (or datautils.ColumnStack) larger than memory.
+    With `index` (an ExtentIndex of x0, worth building when the same data is evaluated
+    many times), each clause is a binary search in the sorted column, and only the rows
+    in the range of each predicate's narrowest clause are checked. Predicates whose
+    narrowest clause holds more than 1/8 of the rows are still checked chunk by chunk.
+
+    Parameters
+    ----------
+    x0 - array-like, shape=[n_points, n_features], readable by row slices x0[start:stop]
+    predicates - list of n_predicates clause lists
+    selected - optional boolean array, shape=[n_predicates, n_points], e.g., the brush selections
+          the predicates were computed from, or labels of held-out data
+    attribute_names - optional column names of x0, to match clauses by attribute rather than dim
+    index - optional ExtentIndex(x0)
+    chunk_size - number of rows read at once, without index
+    return_masks - if False, only count the points (masks are not kept in memory)
+
+    Returns
+    -------
+    masks, qualities
+    masks - boolean numpy array, shape=[n_predicates, n_points] (None if return_masks is False)
+    qualities - if selected is given, a list of dict(brush, accuracy, precision, recall, f1)
+          per predicate, as in compute_predicate_sequence; else a list of dict(brush, n_predicted)
+    """
+    n_points, n_features = x0.shape
+    n_predicates = len(predicates)
+    vmin, vmax = predicates_to_boxes(predicates, n_features, attribute_names)
+    if selected is not None:
+        selected = np.asarray(selected, dtype=bool)
+    masks = np.zeros((n_predicates, n_points), dtype=bool) if return_masks else None
+    n_predicted = np.zeros(n_predicates, dtype=int)
+    tp = np.zeros(n_predicates, dtype=int)
+
+    scanned = range(n_predicates)
+    if index is not None:
+        scanned = []
+        for t, rows in enumerate(index.rows_in_boxes(vmin, vmax, scan=False)):
+            if rows is None:
+                scanned.append(t)
+                continue
+            n_predicted[t] = len(rows)
+            if return_masks:
+                masks[t, rows] = True
+            if selected is not None:
+                tp[t] = selected[t, rows].sum()
+    if len(scanned) > 0:
+        # the constrained columns of each predicate
+        constrained = {
+            t: np.flatnonzero(np.isfinite(vmin[t]) | np.isfinite(vmax[t]))
+            for t in scanned
+        }
+        for i in range(0, n_points, chunk_size):
+            x = np.asarray(x0[i : i + chunk_size])
+            for t, columns in constrained.items():
+                values = x[:, columns]
+                inside = (
+                    (values >= vmin[t, columns]) & (values <= vmax[t, columns])
+                ).all(1)
+                n_predicted[t] += inside.sum()
+                if return_masks:
+                    masks[t, i : i + chunk_size] = inside
+                if selected is not None:
+                    tp[t] += (inside & selected[t, i : i + chunk_size]).sum()
+
+    if selected is None:
+        qualities = [
+            dict(brush=t, n_predicted=int(n)) for t, n in enumerate(n_predicted)
+        ]
+    else:
+        qualities = _qualities(n_points, n_predicted, selected.sum(1), tp)
+    return masks, qualities
@@ -0,0 +1,292 @@
+"""
+Server-side "data extent" predicates (predicate_mode="server data extent").
+The predicate of a brush is the [min, max] interval of every attribute over its selected points.
+Per-column sort orders are computed once per dataset, so that the extents of many brushes
+are found without holding one crossfilter dimension per attribute in the browser.
+"""
+
+import time
+
+import numpy as np
+
+
+class ExtentIndex:
+    """
+    Order-statistic index of a data matrix: the argsort of each column, and the sorted columns.
+
+    The min (max) of column k over a selection is the value of the first (last) row
+    in the column's sort order that is selected. For a selection of m out of n points,
+    that row is found after scanning about n / m rows of the order (if the selection is not
+    correlated with the column), while gathering the selected rows costs m rows,
+    so each brush uses the cheaper one.
+    The rows inside an interval of column k are a contiguous range of order[k],
+    found by binary search in sorted[k] (see rows_in_boxes).
+    NaNs sort last: the first n_valid[k] rows of order[k] are the non-NaN values of column k,
+    and extents ignore NaNs.
+
+    Parameters
+    ----------
+    x0 - numpy array, shape=[n_points, n_features]. Data points, indexed as floats
+         (e.g., the object array of a DataFrame with bool columns)
+    """
+
+    def __init__(self, x0):
+        self.x0 = np.asarray(x0)
+        if not np.issubdtype(self.x0.dtype, np.floating):
+            self.x0 = self.x0.astype(float)
+        n_points, n_features = self.x0.shape
+        dtype = np.int32 if n_points < 2**31 else np.int64
+        # order[k] lists the rows by increasing value of column k, shape [n_features, n_points]
+        # (sorting contiguous columns is several times faster than sorting along axis 0)
+        columns = np.ascontiguousarray(self.x0.T)
+        order = np.argsort(columns, axis=1)
+        self.sorted = np.take_along_axis(columns, order, 1)
+        self.order = order.astype(dtype)
+        self.columns = np.arange(n_features)
+        self.n_valid = n_points - np.isnan(self.sorted).sum(1)
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.sorted.nbytes
+
+    def _first_selected(self, selected, order, skip=None, max_rounds=3):
+        """
+        For each brush (rows of selected) and column (rows of order),
+        the position in order of the first selected row, shape [n_brushes, n_features].
+        Scans the orders in blocks that double in size, for all brushes and columns at once.
+        Gives up (position -1) after max_rounds blocks, e.g., when the selection is a range of the column.
+        skip - optional integer array, shape [n_features]: positions below skip[k] of order[k]
+               are ignored (the NaNs at the start of reversed orders)
+        """
+        n_brushes, n_points = selected.shape
+        position = np.full((n_brushes, order.shape[0]), -1)
+        # ~4 selected rows per block on average for the smallest selection
+        block = int(min(n_points, max(64, 4 * n_points / selected.sum(1).min())))
+        start = 0
+        for _ in range(max_rounds):
+            if start >= n_points:
+                break
+            stop = min(n_points, start + block)
+            hit = selected[:, order[:, start:stop]]  # [n_brushes, n_features, block]
+            if skip is not None:
+                hit &= np.arange(start, stop) >= skip[:, None]
+            found = (position < 0) & hit.any(2)
+            position[found] = start + hit.argmax(2)[found]
+            if (position >= 0).all():
+                break
+            start = stop
+            block *= 2
+        return position
+
+    def extents(self, selected):
+        """
+        Min and max of every column over the selected points of each brush, ignoring NaNs.
+
+        Parameters
+        ----------
+        selected - boolean numpy array, shape=[n_brushes, n_points]
+
+        Returns
+        -------
+        vmin, vmax - numpy arrays, shape=[n_brushes, n_features], NaN for empty selections
+              and for columns that are NaN at every selected point
+        """
+        selected = np.asarray(selected, dtype=bool)
+        n_brushes, n_points = selected.shape
+        n_features = self.x0.shape[1]
+        vmin = np.full((n_brushes, n_features), np.nan)
+        vmax = np.full((n_brushes, n_features), np.nan)
+        count = selected.sum(1)
+        small = (count > 0) & (count * count <= n_points)
+        for t in np.flatnonzero(small):
+            rows = self.x0[selected[t]]
+            # fmin and fmax skip NaNs, without nanmin's warning on all-NaN columns
+            vmin[t] = np.fmin.reduce(rows, 0)
+            vmax[t] = np.fmax.reduce(rows, 0)
+        large = np.flatnonzero(count * count > n_points)
+        if large.size > 0:
+            # the first selected row is a NaN only if all selected rows are
+            first = self._first_selected(selected[large], self.order)
+            reverse = self.order[:, ::-1]
+            last = self._first_selected(
+                selected[large], reverse, skip=n_points - self.n_valid
+            )
+            vmin[large] = self.sorted[self.columns, first.clip(0)]
+            vmax[large] = self.sorted[self.columns, n_points - 1 - last.clip(0)]
+            # columns not resolved by the scan: gather the selected rows
+            for i, t in enumerate(large):
+                pending = np.flatnonzero((first[i] < 0) | (last[i] < 0))
+                if pending.size > 0:
+                    rows = self.x0[selected[t]][:, pending]
+                    vmin[t, pending] = np.fmin.reduce(rows, 0)
+                    vmax[t, pending] = np.fmax.reduce(rows, 0)
+        return vmin, vmax
+
+    def rows_in_boxes(self, vmin, vmax, scan=True):
+        """
+        Rows inside each box [vmin, vmax] (bounds included), one box per brush or predicate.
+        Bounds can be -inf or inf for unconstrained columns.
+        When the box's narrowest interval holds few rows (a range of the column's order,
+        found by binary search), only those rows are checked, and only against the intervals
+        that exclude some rows; otherwise all rows are scanned in order.
+
+        Parameters
+        ----------
+        vmin, vmax - numpy arrays, shape=[n_boxes, n_features]
+        scan - if False, boxes that need a scan are left to the caller (None in the result),
+               e.g., to scan the data once for many boxes
+
+        Returns
+        -------
+        list of n_boxes integer numpy arrays of row numbers (or None)
+        """
+        lo = np.stack(
+            [np.searchsorted(s, vmin[:, k], "left") for k, s in enumerate(self.sorted)],
+            1,
+        )
+        hi = np.stack(
+            [
+                np.searchsorted(s, vmax[:, k], "right")
+                for k, s in enumerate(self.sorted)
+            ],
+            1,
+        )
+        n_points = self.x0.shape[0]
+        # infinite bounds do not exclude the NaNs at the end of the sorted columns
+        lo[np.isneginf(vmin)] = 0
+        hi[np.isposinf(vmax)] = n_points
+        narrowest = (hi - lo).argmin(1)
+        boxes = []
+        for t in range(vmin.shape[0]):
+            k = narrowest[t]
+            constrained = np.flatnonzero(hi[t] - lo[t] < n_points)
+            if hi[t, k] - lo[t, k] > n_points // 8 and not scan:
+                rows = None
+            elif hi[t, k] - lo[t, k] > n_points // 8:
+                # random access to most rows is slower than a sequential scan
+                rows = np.flatnonzero(
+                    np.concatenate(
+                        [
+                            (
+                                (x[:, constrained] >= vmin[t, constrained])
+                                & (x[:, constrained] <= vmax[t, constrained])
+                            ).all(1)
+                            for x in np.array_split(self.x0, -(-n_points // 2**16))
+                        ]
+                    )
+                )
+            else:
+                rows = self.order[k, lo[t, k] : hi[t, k]]
+                for j in constrained:
+                    if j != k:
+                        value = self.x0[rows, j]
+                        rows = rows[(value >= vmin[t, j]) & (value <= vmax[t, j])]
+            boxes.append(rows)
+        return boxes
+
+    def count_in_box(self, vmin, vmax, selected=None):
+        """
+        Number of points inside the box [vmin, vmax] of each brush (see rows_in_boxes),
+        and, if selected is given, the number of selected points of the brush inside it.
+
+        Parameters
+        ----------
+        vmin, vmax - numpy arrays, shape=[n_brushes, n_features]
+        selected - optional boolean numpy array, shape=[n_brushes, n_points]
+
+        Returns
+        -------
+        n_inside, n_selected_inside - integer numpy arrays, shape=[n_brushes]
+        """
+        boxes = self.rows_in_boxes(vmin, vmax)
+        n_inside = np.array([len(rows) for rows in boxes], dtype=int)
+        n_selected_inside = np.zeros(len(boxes), dtype=int)
+        if selected is not None:
+            for t, rows in enumerate(boxes):
+                n_selected_inside[t] = selected[t, rows].sum()
+        return n_inside, n_selected_inside
+
+
+def compute_extent_predicates(
+    x0, selected, attribute_names=[], index=None, verbose=False
+):
+    """
+    Data extent predicates of a sequence of brushes, in the format of compute_predicate_sequence.
+
+    x0 - numpy array, shape=[n_points, n_feature]. Data points
+    selected - boolean array. shape=[brush_index, n_points] of selection
+    index - optional ExtentIndex(x0), to skip building the index
+    verbose - if True, print the quality of each predicate
+
+    Returns
+    -------
+    predicates, qualities, info
+    predicates - for each brush, a clause dict(dim, interval, attribute) per attribute.
+          NaNs are ignored, and attributes that are NaN at every selected point have no clause.
+          Brushes that select nothing get the interval [0, 1e-4], as in the browser's data extent mode
+    info - dict with the wall-clock time of each phase (timing), a dict of
+           index_ms - building the index (~0 when `index` is given),
+           query_ms - the extent queries,
+           quality_ms - predicate quality scoring,
+           total_ms - the whole call
+    """
+    start_time = time.perf_counter()
+    if index is None:
+        index = ExtentIndex(x0)
+    x0 = index.x0
+    selected = np.asarray(selected, dtype=bool)
+    n_brushes, n_points = selected.shape
+    index_time = time.perf_counter()
+
+    vmin, vmax = index.extents(selected)
+    empty = selected.sum(1) == 0
+    vmin[empty] = 0
+    vmax[empty] = 1e-4
+    # counted as unconstrained, then left out of the predicates
+    no_value = np.isnan(vmin)
+    vmin[no_value] = -np.inf
+    vmax[no_value] = np.inf
+    query_time = time.perf_counter()
+
+    # points inside every interval of a brush; all of its selected points without NaNs are,
+    # so recall is 1 without NaNs
+    n_pred, tp = index.count_in_box(vmin, vmax, selected)
+    n_selected = selected.sum(1)
+    qualities = []
+    for t in range(n_brushes):
+        precision = tp[t] / n_pred[t] if n_pred[t] > 0 else 0
+        recall = tp[t] / n_selected[t] if n_selected[t] > 0 else 0
+        f1 = 2 / (1 / precision + 1 / recall) if precision > 0 and recall > 0 else 0
+        accuracy = 1 - (n_pred[t] + n_selected[t] - 2 * tp[t]) / n_points
+        if verbose:
+            print(f"brush = {t}, precision = {precision}, recall = {recall}")
+        qualities.append(
+            dict(
+                brush=t,
+                accuracy=float(accuracy),
+                precision=float(precision),
+                recall=float(recall),
+                f1=float(f1),
+            )
+        )
+    quality_time = time.perf_counter()
+
+    predicates = [
+        [
+            dict(
+                dim=k,
+                interval=[vmin[t, k].item(), vmax[t, k].item()],
+                attribute=attribute_names[k],
+            )
+            for k in np.flatnonzero(~no_value[t]).tolist()
+        ]
+        for t in range(n_brushes)
+    ]
+    end_time = time.perf_counter()
+    timing = dict(
+        index_ms=(index_time - start_time) * 1000,
+        query_ms=(query_time - index_time) * 1000,
+        quality_ms=(quality_time - query_time) * 1000,
+        total_ms=(end_time - start_time) * 1000,
+    )
+    return predicates, qualities, dict(timing=timing)
@@ -0,0 +1,103 @@
+"""
+Level of detail (LOD) of the projection view for large embeddings.
+The widget keeps every point in Python, for brush selections and predicate training,
+and sends the front end at most Dimbridge.lod_max_points of them, chosen by LODIndex,
+for the region of the projection on screen (Dimbridge.viewport). Zooming in
+shows more of the points of the smaller region, up to all of them.
+"""
+
+import numpy as np
+
+from .datautils import numpy2json, pandas2json
+
+
+class LODIndex:
+    """
+    Display priority of 2D points, for density-preserving subsamples.
+
+    Points are binned on an n_cells x n_cells grid and shuffled within each cell. The level
+    of the point of rank r in a cell of m points is r / m, so that the points of level below f
+    are about a fraction f of every cell: the densest regions stay the densest, and every
+    occupied cell (e.g., of outliers) has its level 0 point, shown first.
+    A subsample of k points is the k points of lowest level, so subsamples of a region
+    are nested: zooming in only adds points to those already shown.
+
+    Parameters
+    ----------
+    x, y - numpy arrays, shape=[n_points]. Point coordinates
+    n_cells - number of grid cells along each axis
+    keep - optional integer array of points shown before any other (e.g., the extremes of
+           each data column, so that the displayed data has the extent of the full data)
+    seed - seed of the shuffle within cells
+    """
+
+    def __init__(self, x, y, n_cells=64, keep=None, seed=0):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        n_points = self.x.shape[0]
+        finite = np.isfinite(self.x) & np.isfinite(self.y)
+        cell = np.full(n_points, n_cells**2)  # non-finite points in a cell of their own
+        if finite.any():
+            i = self._bin(self.x, finite, n_cells)
+            j = self._bin(self.y, finite, n_cells)
+            cell[finite] = j * n_cells + i
+        rng = np.random.default_rng(seed)
+        # by cell, then at random within each cell (cell + u < cell + 1)
+        by_cell = np.argsort(cell + rng.random(n_points))
+        count = np.bincount(cell, minlength=n_cells**2 + 1)
+        first = np.cumsum(count) - count
+        rank = np.empty(n_points)
+        rank[by_cell] = np.arange(n_points) - first[cell[by_cell]]
+        level = rank / count[cell]
+        if keep is not None:
+            level[np.asarray(keep, dtype=int)] = -1
+        # lowest level first, ties in random order
+        shuffle = rng.permutation(n_points)
+        self.order = shuffle[np.argsort(level[shuffle], kind="stable")]
+
+    @staticmethod
+    def _bin(value, finite, n_cells):
+        vmin, vmax = value[finite].min(), value[finite].max()
+        size = max(vmax - vmin, 1e-12) / n_cells
+        return np.clip(((value[finite] - vmin) / size).astype(int), 0, n_cells - 1)
+
+    def sample(self, max_points, viewport=None):
+        """
+        Rows of at most max_points points to display, in increasing order.
+
+        viewport - optional [x0, x1, y0, y1], to sample the points inside it (bounds included)
+        """
+        order = self.order
+        if viewport is not None and len(viewport) > 0:
+            x0, x1, y0, y1 = viewport
+            inside = (self.x >= x0) & (self.x <= x1) & (self.y >= y0) & (self.y <= y1)
+            order = order[inside[order]]
+        return np.sort(order[:max_points])
+
+
+def _lod_rows(data, widget):
+    """
+    Rows of data to send, from widget._lod_rows. ipywidgets serializes a new value of x, y
+    or data before the widget's observers resample the points, so rows can still be those
+    of the previous value; rows out of range of the new one are dropped, and the observer
+    sends the new sample right after
+    """
+    rows = getattr(widget, "_lod_rows", None)
+    if rows is not None and len(rows) > 0 and rows[-1] >= len(data):
+        rows = rows[rows < len(data)]  # rows are sorted
+    return rows
+
+
+# serializers of the widget's x, y, c and data, which only send the rows in widget._lod_rows
+def lod_numpy2json(data, widget):
+    rows = _lod_rows(data, widget)
+    return numpy2json(data if rows is None else data[rows], widget)
+
+
+def lod_pandas2json(df, widget=None):
+    rows = _lod_rows(df, widget)
+    return pandas2json(df if rows is None else df.iloc[rows], widget)
+
+
+def optional_numpy2json(data, widget):
+    return None if data is None else numpy2json(data, widget)
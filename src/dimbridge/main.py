@@ -1,19 +1,46 @@
 # standard lib
 import importlib.metadata
 import pathlib
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # anywidget / UI
 import anywidget
+
 # computational
 import numpy as np
 import pandas as pd
 import traitlets
-from traitlets import (Any, Bool, Callable, Dict, Enum, Float, Instance, Int,
-                       List, Set, Unicode, default, observe)
+from traitlets import (
+    Any,
+    Bool,
+    Callable,
+    Dict,
+    Enum,
+    Float,
+    Instance,
+    Int,
+    List,
+    Set,
+    Unicode,
+    Union,
+    default,
+    observe,
+)
 
 # custom modules
-from .datautils import numpy2json, pandas2json
-from .predicate_engine import compute_predicate_sequence
+from .brushes import GridIndex, brush_rects
+from .datautils import json2selection, selection2json
+from .extent_engine import ExtentIndex, compute_extent_predicates
+from .lod import LODIndex, lod_numpy2json, lod_pandas2json, optional_numpy2json
+from .predicate_engine import Cancelled, prepare_data
+from .result_cache import ResultCache, cached_predicate_sequence, data_digest
+
+# default of get_predicate's training options: use the widget's trait.
+# None is a value there, as in compute_predicate_sequence (e.g., tol=None disables early stopping)
+_UNSET = object()
 
 
 class Dimbridge(anywidget.AnyWidget):
@@ -28,10 +55,11 @@ class Dimbridge(anywidget.AnyWidget):
     predicate_host = Unicode("http://localhost:9001").tag(sync=True)
     dataset_name = Unicode("dummy_dataset_name").tag(sync=True)
 
-    data = Instance(pd.DataFrame).tag(sync=True, to_json=pandas2json)
-    x = Instance(np.ndarray).tag(sync=True, to_json=numpy2json)
-    y = Instance(np.ndarray).tag(sync=True, to_json=numpy2json)
-    c = Instance(np.ndarray).tag(sync=True, to_json=numpy2json)  # mark color
+    # x, y, c and data are sent to the front end at the level of detail of lod_max_points
+    data = Instance(pd.DataFrame).tag(sync=True, to_json=lod_pandas2json)
+    x = Instance(np.ndarray).tag(sync=True, to_json=lod_numpy2json)
+    y = Instance(np.ndarray).tag(sync=True, to_json=lod_numpy2json)
+    c = Instance(np.ndarray).tag(sync=True, to_json=lod_numpy2json)  # mark color
     # s = Instance(np.ndarray).tag(sync=True, to_json=numpy2json)  # mark size
     s = Float(default_value=4).tag(sync=True)
 
@@ -41,9 +69,12 @@ class Dimbridge(anywidget.AnyWidget):
     # color map
     cmap = Enum(["viridis", "set10"], default_value="viridis").tag(sync=True)
 
+    # "data extent" indexes every attribute in the browser;
+    # "server data extent" computes the same predicates in python (see extent_engine.py)
     predicate_mode = Enum(
         [
             "data extent",
+            "server data extent",
             "predicate regression",
         ],
         default_value="data extent",
@@ -73,9 +104,81 @@ class Dimbridge(anywidget.AnyWidget):
     splom_attributes = List([]).tag(sync=True)
     image_urls = List([]).tag(sync=True)
 
+    # level of detail, off by default: with more than lod_max_points points, the front
+    # end shows a density-preserving subsample of the points in the viewport (see lod.py).
+    # Browser "data extent" predicates, the SPLOM and the images only see that subsample,
+    # so it is meant for "server data extent" and "predicate regression"
+    lod_max_points = Int(None, allow_none=True)
+    # region of the projection on screen, [x0, x1, y0, y1], or [] for all of it.
+    # Set by the front end on zoom, which resamples the points shown
+    viewport = List([]).tag(sync=True)
+    # rows of the points sent to the front end, None if all of them are
+    lod_index = Instance(np.ndarray, allow_none=True).tag(
+        sync=True, to_json=optional_numpy2json
+    )
+
+    # predicate regression settings
+    n_iter = Int(1000)  # maximum number of training iterations
+    tol = Float(1e-4, allow_none=True)  # early stopping tolerance, None to disable
+    time_budget_ms = Float(None, allow_none=True)  # wall-clock budget of training
+    # "numpy", a torch engine ("autograd", "fused"), which imports torch on first use,
+    # or "parallel", which trains on row shards in one worker process per CPU core
+    engine = Enum(["numpy", "autograd", "fused", "parallel"], default_value="numpy")
+    # "sgd", or "lbfgs" (full-batch quasi-Newton, fewer loss evaluations)
+    solver = Enum(["sgd", "lbfgs"], default_value="sgd")
+    # print the training progress bar and predicate qualities to the kernel's stdout
+    verbose = Bool(True)
+    # warm start each brush from its last optimized parameters
+    # when the new selection is similar enough (Jaccard index) to the cached one
+    warm_start = Bool(True)
+    warm_start_similarity = Float(0.8)
+    _warm_start_cache = Dict({})  # brush index -> dict(selected, a, mu)
+    # compute predicates on a background thread so that brushing does not block the kernel.
+    # A newer selection cancels the computation in flight; only the latest result is shown
+    run_in_background = Bool(True)
+    # anytime mode: while training in the background, show the predicates of the best parameters
+    # so far every anytime_ms milliseconds (and/or every anytime_iter iterations),
+    # refined in place in the predicate view until the final result arrives
+    anytime = Bool(False)
+    anytime_ms = Float(250, allow_none=True)
+    anytime_iter = Int(None, allow_none=True)
+    # optional directory of a persistent cache of predicate regression results
+    # (see result_cache.py), capped at result_cache_mb, least recently used results evicted first
+    result_cache_dir = Unicode(None, allow_none=True)
+    result_cache_mb = Float(1024)
+
     # output
-    selected = List([]).tag(sync=True)  # output attributes
-    predicates = Dict({}).tag(sync=True)  # value that triggers front end update
+    # output attributes
+    # brush selections, a boolean array of shape [n_brushes, n_points].
+    # The front end sends brushes instead; selected is synced as a bit-packed binary buffer
+    # (see json2selection) for other clients of the model
+    selected = Union([Instance(np.ndarray), List()], default_value=[]).tag(
+        sync=True, to_json=selection2json, from_json=json2selection
+    )
+    # brush geometry in projection coordinates (see brushes.py), an alternative to selected
+    # that the front end sends instead of per-point masks
+    brushes = Dict({}).tag(sync=True)
+    # value that triggers front end update,
+    # with partial=True for intermediate predicates of anytime mode
+    predicates = Dict({}).tag(sync=True)
+    status = Enum(["idle", "busy"], default_value="idle").tag(sync=True)
+    # wall-clock time of each phase of the last predicate computation, in milliseconds
+    # (see compute_predicate_sequence)
+    timing = Dict({}, read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._job_lock = threading.Lock()
+        self._job = None  # the latest predicate computation request
+        self._prepared = None  # normalized training data, built lazily from data
+        self._extent_index = None  # ExtentIndex of data, built lazily
+        self._grid_index = None  # GridIndex of x and y, built lazily
+        self._data_digest = None  # content hash of data, for the result cache
+        self._result_cache = None
+        self._lod = None  # LODIndex of x and y, built lazily
+        self._lod_key = None  # ids of the x, y and data of _lod
+        self._lod_rows = None  # rows of x, y, c and data that are sent, None for all
+        super().__init__(*args, **kwargs)
 
     @default("splom_attributes")
     def _default_splom_attributes(self):
@@ -86,27 +189,261 @@ class Dimbridge(anywidget.AnyWidget):
         return np.repeat([[31, 119, 180]], self.x.shape[0], 0).astype(np.int32)
 
     # response to value change
+    @observe("data")
+    def _observe_data(self, change):
+        self._prepared = None
+        self._extent_index = None
+        self._data_digest = None
+        # cached parameters live in the normalized space of the previous data
+        self._warm_start_cache = {}
+
+    @observe("x", "y")
+    def _observe_projection(self, change):
+        self._grid_index = None
+
+    @observe("x", "y", "data", "lod_max_points", "viewport")
+    def _observe_lod(self, change):
+        self._update_lod()
+
+    def _update_lod(self):
+        """Resample the points shown, and send them if they changed"""
+        if self.x is None or self.y is None:
+            return
+        n_points = self.x.shape[0]
+        if self.y.shape[0] != n_points or (
+            self.data is not None and len(self.data) != n_points
+        ):
+            return  # x, y and data are being replaced one at a time
+        rows = None
+        if self.lod_max_points is not None and (
+            n_points > self.lod_max_points or len(self.viewport) > 0
+        ):
+            key = (id(self.x), id(self.y), id(self.data))
+            if self._lod is None or self._lod_key != key:
+                # show the min and max of every column, so that the front end's
+                # scales and data extents are those of the full data
+                keep = []
+                if self.data is not None:
+                    values = self.data.select_dtypes("number").to_numpy(dtype=float)
+                    values = values[:, np.isfinite(values).any(0)]
+                    if values.size > 0:
+                        keep = np.r_[np.nanargmin(values, 0), np.nanargmax(values, 0)]
+                self._lod = LODIndex(self.x, self.y, keep=keep)
+                self._lod_key = key
+            rows = self._lod.sample(self.lod_max_points, self.viewport)
+        if rows is None and self._lod_rows is None:
+            return
+        if rows is not None and self._lod_rows is not None:
+            if np.array_equal(rows, self._lod_rows):
+                return
+        self._lod_rows = rows
+        # the front end redraws on lod_index, so it is sent after the points
+        if self.comm is not None:
+            self.send_state(["x", "y", "c", "data"])
+        # int32, which the front end reads as numbers rather than BigInts
+        self.lod_index = None if rows is None else rows.astype(np.int32)
+
+    @observe("result_cache_dir", "result_cache_mb")
+    def _observe_result_cache(self, change):
+        self._result_cache = None
+
     @observe("selected")
     def _observe_selected(self, change):
-        subsets = change.new
-        self.predicates = self.get_predicate(subsets)  ## this triggers js update
-        # self.send(predicates)
+        self._request_predicate(change.new)
+
+    @observe("brushes")
+    def _observe_brushes(self, change):
+        if change.new:
+            self._request_predicate(self.resolve_brushes(change.new))
+
+    def resolve_brushes(self, geometry):
+        """
+        Selections of a brush geometry dict (see brushes.py), shape [n_brushes, n_points].
+        Resolved with a grid over x and y, built once and rebuilt after x or y change
+        """
+        if self._grid_index is None:
+            self._grid_index = GridIndex(self.x, self.y)
+        return self._grid_index.select(brush_rects(geometry))
+
+    def _request_predicate(self, subsets):
+        """Compute and show the predicates of subsets, on the worker thread if run_in_background"""
+        if not self.run_in_background:
+            self._show_predicates(self.get_predicate(subsets))
+            return
+        with self._job_lock:
+            if self._job is not None:
+                self._job["cancel"].set()  # abandon the stale computation
+            job = dict(subsets=subsets, cancel=threading.Event())
+            self._job = job
+            self.status = "busy"
+        self._executor.submit(self._run_job, job)
+
+    def _run_job(self, job):
+        """Compute predicates of a job on the worker thread, unless a newer job supersedes it"""
+        intermediate = None
+        if self.anytime and self.predicate_mode == "predicate regression":
 
-    def get_predicate(self, subsets):
-        subsets = np.array(subsets)
-        x0 = self.data.to_numpy()
+            def intermediate(partial):
+                with self._job_lock:
+                    if self._job is job and not job["cancel"].is_set():
+                        self._show_predicates(dict(partial, partial=True))
+
+        try:
+            if job["cancel"].is_set():
+                return
+            predicates = self.get_predicate(
+                job["subsets"],
+                is_cancelled=job["cancel"].is_set,
+                intermediate=intermediate,
+            )
+        except Cancelled:
+            return
+        except Exception:
+            traceback.print_exc()
+            predicates = None
+        with self._job_lock:
+            if self._job is not job:
+                return
+            self._job = None
+            if predicates is not None:
+                self._show_predicates(predicates)
+            self.status = "idle"
+
+    def _show_predicates(self, predicates):
+        if not predicates.get("partial", False):
+            self.set_trait("timing", predicates["timing"])
+        self.predicates = predicates  ## this triggers js update
+
+    def get_predicate(
+        self,
+        subsets,
+        n_iter=_UNSET,
+        tol=_UNSET,
+        time_budget_ms=_UNSET,
+        is_cancelled=None,
+        intermediate=None,
+    ):
+        """
+        Compute predicates of the brushed subsets.
+        Training options default to the widget's n_iter, tol and time_budget_ms traits,
+        and the engine and solver to the engine and solver traits. Passing tol=None or
+        time_budget_ms=None disables early stopping or the time budget for this call.
+        Raises Cancelled if is_cancelled() returns True during training.
+        intermediate - optional callable, given the predicates of the best parameters so far
+              during training, every anytime_ms and/or anytime_iter (see compute_predicate_sequence)
+        """
+        subsets = np.asarray(subsets, dtype=bool)
+        if self.predicate_mode == "server data extent":
+            return self._get_extent_predicate(subsets)
+        tic = time.perf_counter()
+        prepared = self._get_prepared_data()
+        cache = self._get_result_cache()
+        if cache is not None and self._data_digest is None:
+            self._data_digest = data_digest(prepared["x0"])
+        prepare_ms = (time.perf_counter() - tic) * 1000
         columns = self.data.columns.to_list()
-        # Jointly optimize the sequence
-        predicates, qualities, parameters = compute_predicate_sequence(
-            x0,
+        warm_start = self._get_warm_start(subsets) if self.warm_start else None
+        # Jointly optimize the sequence, or read it from the result cache
+        predicates, qualities, parameters, info = cached_predicate_sequence(
+            cache,
+            prepared["x0"],
             subsets,
+            data_key=self._data_digest,
+            prepared=prepared,
             attribute_names=columns,
+            warm_start=warm_start,
+            is_cancelled=is_cancelled,
+            intermediate=intermediate,
+            intermediate_iter=self.anytime_iter,
+            intermediate_ms=self.anytime_ms,
+            engine=self.engine,
+            solver=self.solver,
+            verbose=self.verbose,
+            n_iter=self.n_iter if n_iter is _UNSET else n_iter,
+            tol=self.tol if tol is _UNSET else tol,
+            time_budget_ms=(
+                self.time_budget_ms if time_budget_ms is _UNSET else time_budget_ms
+            ),
         )
+        self._warm_start_cache = {
+            t: dict(selected=st, a=parameters["a"][t], mu=parameters["mu"][t])
+            for t, st in enumerate(subsets)
+        }
         return dict(
             predicates=predicates,
             qualities=qualities,
+            n_iter=info["n_iter"],
+            # data preparation happens here, once per dataset, rather than in the engine
+            timing=dict(
+                info["timing"],
+                prepare_ms=info["timing"]["prepare_ms"] + prepare_ms,
+                total_ms=info["timing"]["total_ms"] + prepare_ms,
+            ),
         )
 
+    def _get_extent_predicate(self, subsets):
+        """Data extent predicates of the brushed subsets, from the per-column indexes of data"""
+        tic = time.perf_counter()
+        # numeric and bool columns only; other columns have no extent
+        data = self.data.select_dtypes(["number", "bool"])
+        if self._extent_index is None:
+            self._extent_index = ExtentIndex(data.to_numpy(dtype=float))
+        index_ms = (time.perf_counter() - tic) * 1000
+        predicates, qualities, info = compute_extent_predicates(
+            self._extent_index.x0,
+            subsets,
+            attribute_names=data.columns.to_list(),
+            index=self._extent_index,
+            verbose=self.verbose,
+        )
+        timing = info["timing"]
+        return dict(
+            predicates=predicates,
+            qualities=qualities,
+            n_iter=0,
+            # the index is built here, once per dataset
+            timing=dict(
+                timing,
+                index_ms=timing["index_ms"] + index_ms,
+                total_ms=timing["total_ms"] + index_ms,
+            ),
+        )
+
+    def _get_prepared_data(self):
+        """Normalized training data and column statistics, cached until data changes"""
+        prepared = self._prepared
+        if prepared is None:
+            prepared = prepare_data(self.data.to_numpy())
+            self._prepared = prepared
+        return prepared
+
+    def _get_result_cache(self):
+        """ResultCache of result_cache_dir, or None without one"""
+        if self.result_cache_dir is None:
+            return None
+        if self._result_cache is None:
+            self._result_cache = ResultCache(
+                self.result_cache_dir, int(self.result_cache_mb * 2**20)
+            )
+        return self._result_cache
+
+    def _get_warm_start(self, subsets):
+        """
+        For each brush, return its cached parameters if the cached selection
+        overlaps the new one by at least warm_start_similarity (Jaccard index), else None
+        """
+        warm_start = []
+        for t, st in enumerate(subsets):
+            cached = self._warm_start_cache.get(t)
+            init = None
+            if cached is not None and cached["selected"].shape == st.shape:
+                union = (cached["selected"] | st).sum()
+                intersection = (cached["selected"] & st).sum()
+                if union > 0 and intersection / union >= self.warm_start_similarity:
+                    init = cached
+            warm_start.append(init)
+        return warm_start
+
     def __repr__(self):
         """bypass ipywidget's __repr__() from printing Pandas DataFrame"""
         return "DimBridge()"
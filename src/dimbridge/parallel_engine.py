@@ -0,0 +1,228 @@
+"""
+Data-parallel engine of compute_predicate_sequence (engine="parallel").
+The rows of the normalized data are split into contiguous shards, one per worker process.
+Workers read the data from shared memory, compute the partial weighted BCE and its gradients
+of all brushes on their shard, and the partial sums are added up in this process every step.
+"""
+
+import multiprocessing
+import os
+import threading
+import uuid
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .predicate_engine import Engine, NumpyEngine
+
+# BLAS/OpenMP threads per worker, so that n_workers processes do not oversubscribe the cores
+_WORKER_ENV = dict(OMP_NUM_THREADS="1", OPENBLAS_NUM_THREADS="1", MKL_NUM_THREADS="1")
+
+
+def _worker(conn, x_name, shape, start, stop):
+    """
+    Loop of a worker process over the rows start:stop of the shared data.
+    Serves the engines of concurrent compute_predicate_sequence calls, keyed by the name
+    of the shared memory block holding their selection
+    """
+    x_shm = SharedMemory(name=x_name)
+    x = np.ndarray(shape, dtype=np.float32, buffer=x_shm.buf)[start:stop]
+    engines = {}  # selection name -> (shared memory, NumpyEngine on this shard)
+    while True:
+        command, key, args = conn.recv()
+        if command == "close":
+            break
+        try:
+            if command == "setup":
+                n_brushes, weight_selected, weight_unselected = args
+                shm = SharedMemory(name=key)
+                selected = np.ndarray((n_brushes, shape[0]), dtype=bool, buffer=shm.buf)
+                engine = NumpyEngine(
+                    dict(x=x),
+                    selected[:, start:stop],
+                    weight_selected,
+                    weight_unselected,
+                )
+                engines[key] = (shm, engine)
+                result = None
+            elif command == "release":
+                shm, engine = engines.pop(key)
+                del engine
+                shm.close()
+                result = None
+            elif command == "loss_and_grad":
+                result = engines[key][1].loss_and_grad(*args)
+            elif command == "predict":
+                result = engines[key][1].predict(*args)
+            else:
+                raise ValueError(f"unknown command: {command!r}")
+        except Exception as e:
+            result = e
+        conn.send(result)
+    for shm, engine in engines.values():
+        del engine
+        shm.close()
+    del x
+    x_shm.close()
+
+
+def _shutdown(processes, conns, shm):
+    for conn in conns:
+        try:
+            conn.send(("close", None, None))
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    shm.close()
+    shm.unlink()
+
+
+class ShardPool:
+    """
+    Worker processes sharing one copy of the normalized data x, shape=[n_points, n_features].
+    Worker k owns rows bounds[k]:bounds[k+1].
+    Pools are cached in the prepared data (see ShardedEngine), so they are started once per dataset,
+    and shut down when the prepared data is garbage collected, or by close()
+    """
+
+    def __init__(self, x, n_workers):
+        self.n_workers = n_workers
+        self.shape = x.shape
+        self.bounds = np.linspace(0, x.shape[0], n_workers + 1).astype(int)
+        self.shm = SharedMemory(create=True, size=max(1, x.nbytes))
+        np.ndarray(x.shape, dtype=np.float32, buffer=self.shm.buf)[:] = x
+        # one request in flight per pool; concurrent calls take turns step by step
+        self.lock = threading.Lock()
+
+        context = multiprocessing.get_context("spawn")
+        self.conns = []
+        self.processes = []
+        env = {k: os.environ.get(k) for k in _WORKER_ENV}
+        os.environ.update(_WORKER_ENV)  # inherited by the spawned workers
+        try:
+            for start, stop in zip(self.bounds[:-1], self.bounds[1:]):
+                conn, child_conn = context.Pipe()
+                process = context.Process(
+                    target=_worker,
+                    args=(child_conn, self.shm.name, self.shape, start, stop),
+                    daemon=True,
+                )
+                process.start()
+                child_conn.close()
+                self.conns.append(conn)
+                self.processes.append(process)
+        finally:
+            for k, v in env.items():
+                if v is None:
+                    os.environ.pop(k)
+                else:
+                    os.environ[k] = v
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self.processes, self.conns, self.shm
+        )
+
+    def run(self, command, key, args_per_worker):
+        """Send one command to every worker, and return their results in shard order"""
+        with self.lock:
+            for conn, args in zip(self.conns, args_per_worker):
+                conn.send((command, key, args))
+            results = [conn.recv() for conn in self.conns]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    @property
+    def nbytes(self):
+        """Size of the shared copy of the data"""
+        return self.shm.size
+
+    def close(self):
+        self._finalizer()
+
+
+class ShardedEngine(Engine):
+    """
+    NumpyEngine evaluated data-parallel by n_workers processes (os.cpu_count() by default).
+    Each step sends a and mu to the workers, and reduces their partial BCE and gradients.
+    Use ShardedEngine.with_workers(n) for a fixed number of workers.
+
+    The worker pool and its shared copy of the normalized data are cached
+    in the prepared data, so they are created on the first call per dataset
+    (which takes the start-up time of the worker processes).
+    """
+
+    n_workers = None
+
+    def __init__(self, prepared, selected, weight_selected, weight_unselected):
+        super().__init__(prepared, selected, weight_selected, weight_unselected)
+        n_workers = self.n_workers or os.cpu_count() or 1
+        n_workers = max(1, min(n_workers, prepared["x"].shape[0]))
+        key = f"shard_pool_{n_workers}"
+        if key not in prepared:
+            prepared[key] = ShardPool(prepared["x"], n_workers)
+        self.pool = prepared[key]
+
+        # the selection of this call, shared with the workers
+        n_brushes, n_points = selected.shape
+        self.shm = SharedMemory(
+            create=True,
+            size=max(1, selected.size),
+            name=f"dimbridge_{uuid.uuid4().hex}",
+        )
+        np.ndarray(selected.shape, dtype=bool, buffer=self.shm.buf)[:] = selected
+        self.key = self.shm.name
+        args = (n_brushes, np.asarray(weight_selected), np.asarray(weight_unselected))
+        self.pool.run("setup", self.key, [args] * self.pool.n_workers)
+        self._finalizer = weakref.finalize(
+            self, ShardedEngine._release, self.pool, self.key, self.shm
+        )
+
+    @classmethod
+    def with_workers(cls, n_workers):
+        """Subclass with a fixed number of workers, to pass as compute_predicate_sequence(engine=...)"""
+        return type(f"{cls.__name__}{n_workers}", (cls,), dict(n_workers=n_workers))
+
+    @staticmethod
+    def _release(pool, key, shm):
+        if pool._finalizer.alive:
+            pool.run("release", key, [None] * pool.n_workers)
+        shm.close()
+        shm.unlink()
+
+    def loss_and_grad(self, a, mu, index=None, sample_weight=None):
+        a = np.asarray(a)
+        mu = np.asarray(mu)
+        bounds = self.pool.bounds
+        if index is None:
+            args = [(a, mu)] * self.pool.n_workers
+        else:
+            # rows of the minibatch owned by each worker, in the worker's row numbers
+            index = np.asarray(index)
+            shard = np.searchsorted(bounds, index, side="right") - 1
+            args = []
+            for k in range(self.pool.n_workers):
+                mask = shard == k
+                args.append(
+                    (
+                        a,
+                        mu,
+                        index[mask] - bounds[k],
+                        None if sample_weight is None else sample_weight[mask],
+                    )
+                )
+        results = self.pool.run("loss_and_grad", self.key, args)
+        bce, grad_a, grad_mu = (sum(r[i] for r in results) for i in range(3))
+        return bce, grad_a, grad_mu
+
+    def predict(self, a, mu):
+        args = [(np.asarray(a), np.asarray(mu))] * self.pool.n_workers
+        return np.concatenate(self.pool.run("predict", self.key, args), 1)
+
+    def close(self):
+        """Release the selection of this engine in the workers (also done on garbage collection)"""
+        self._finalizer()
@@ -1,17 +1,14 @@
-import io
-import os
-from base64 import b64encode
-from glob import glob
+import time
 from textwrap import dedent
 
 import numpy as np
-import pandas as pd
-import torch
-from natsort import natsorted
-from torch import nn, optim
 from tqdm import tqdm
 
 
+class Cancelled(Exception):
+    """Raised when compute_predicate_sequence is cancelled through is_cancelled"""
+
+
 def predict(x, a, mu):
     r"""
     UMAP-inspired predict function.
@@ -21,192 +18,859 @@ def predict(x, a, mu):
 
     Parameters
     ----------
-    x - Torch tensor, shape [n_data_points, n_features]
+    x - numpy array or Torch tensor, shape [n_data_points, n_features]
         Input data points
-    a - Torch tensor, shape [n_features]
+    a - numpy array or Torch tensor, shape [n_features]
         A parameter for the bounding box extent. 1/a.abs() is the extent of bounding box at prediction=0.5
-    mu - Torch tensor, shape [n_features]
+    mu - numpy array or Torch tensor, shape [n_features]
         A parameter for the bounding box center
     b - Scalar.
         Hyperparameter for predict function. Power exponent
 
     Returns
     -------
-    pred - Torch tensor of predction for each point in x, shape = [n_data_points, 1]
+    pred - numpy array or Torch tensor of predction for each point in x, shape = [n_data_points, 1]
     """
 
     b = 4
-    pred = 1 / (1 + ((a.abs() * (x - mu).abs()).pow(b)).sum(1))
+    pred = 1 / (1 + ((abs(a) * abs(x - mu)) ** b).sum(1))
+    return pred
+
+
+def predict_batch(x, a, mu):
+    r"""
+    Batched version of `predict` that evaluates all brushes at once.
+
+    Parameters
+    ----------
+    x - numpy array or Torch tensor, shape [n_data_points, n_features]
+        Input data points
+    a - numpy array or Torch tensor, shape [n_brushes, n_features]
+        Bounding box extent parameters, one row per brush
+    mu - numpy array or Torch tensor, shape [n_brushes, n_features]
+        Bounding box center parameters, one row per brush
+
+    Returns
+    -------
+    pred - numpy array or Torch tensor of prediction for each brush and point, shape = [n_brushes, n_data_points]
+    """
+    b = 4
+    diff = abs(x[None, :, :] - mu[:, None, :])
+    pred = 1 / (1 + ((abs(a)[:, None, :] * diff) ** b).sum(2))
     return pred
 
 
+def _chunk_rows(n_brushes, n_features, budget=2**24):
+    """Number of data rows per chunk so that a [n_brushes, rows, n_features] temporary has ~budget elements"""
+    return max(1, budget // max(1, n_brushes * n_features))
+
+
+def prepare_data(x0):
+    """
+    Prepare a data matrix for compute_predicate_sequence.
+    The result depends only on x0, so it can be computed once per dataset
+    and reused across brushes via compute_predicate_sequence(..., prepared=...)
+
+    Parameters
+    ----------
+    x0 - numpy array, shape=[n_points, n_feature]. Data points
+
+    Returns
+    -------
+    dict with
+    x0 - the original data
+    x - float32 numpy array of the normalized data
+    mean, scale - float32 numpy arrays of column statistics used for normalization
+    vmin, vmax - numpy arrays of the original data extent
+    """
+    # orginal data extent
+    vmin = x0.min(0)
+    vmax = x0.max(0)
+    x = x0.astype(np.float32)
+    # normalize
+    mean = x.mean(0)
+    scale = x.std(0, ddof=1) + np.float32(1e-6)
+    x = (x - mean) / scale
+    return dict(x0=x0, x=x, mean=mean, scale=scale, vmin=vmin, vmax=vmax)
+
+
+def prepare_data_streaming(x0, chunk_size=2**16):
+    """
+    Out-of-core version of prepare_data, for data larger than memory.
+    Column statistics are computed in a single pass over chunks of chunk_size rows
+    (merging per-chunk means and sums of squares), and no normalized copy of x0 is made:
+    compute_predicate_sequence then trains with StreamingEngine,
+    which normalizes chunks of x0 as it reads them.
+
+    Parameters
+    ----------
+    x0 - array-like, shape=[n_points, n_feature], readable by row slices x0[start:stop]
+         and row indices x0[index_array], e.g., a memory-mapped numpy array
+         (np.load(..., mmap_mode="r")) or datautils.ColumnStack
+    chunk_size - max. number of rows read and processed at once, which bounds peak memory
+
+    Returns
+    -------
+    dict as in prepare_data, with x=None and chunk_size
+    """
+    n_points, n_features = x0.shape
+    count = 0
+    mean = np.zeros(n_features)
+    m2 = np.zeros(n_features)  # sum of squared deviations from the mean
+    vmin = vmax = None
+    for i in range(0, n_points, chunk_size):
+        chunk = np.asarray(x0[i : i + chunk_size])
+        chunk_min = chunk.min(0)
+        chunk_max = chunk.max(0)
+        vmin = chunk_min if vmin is None else np.minimum(vmin, chunk_min)
+        vmax = chunk_max if vmax is None else np.maximum(vmax, chunk_max)
+        chunk = chunk.astype(np.float64)
+        n = chunk.shape[0]
+        chunk_mean = chunk.mean(0)
+        chunk_m2 = ((chunk - chunk_mean) ** 2).sum(0)
+        delta = chunk_mean - mean
+        m2 += chunk_m2 + delta**2 * count * n / (count + n)
+        mean += delta * n / (count + n)
+        count += n
+    scale = np.sqrt(m2 / max(count - 1, 1)).astype(np.float32) + np.float32(1e-6)
+    return dict(
+        x0=x0,
+        x=None,
+        mean=mean.astype(np.float32),
+        scale=scale,
+        vmin=vmin,
+        vmax=vmax,
+        chunk_size=chunk_size,
+    )
+
+
+def _selection_statistics(prepared, selected, chunk_size=2**16):
+    """
+    Per-brush mean and std (ddof=1) of the normalized data,
+    and min and max of the original data, over the selected points of each brush.
+    One pass over chunks of rows (of prepared["chunk_size"] rows in streaming mode),
+    so that no copy of the selected rows of a brush is made
+    """
+    x0 = prepared["x0"]
+    n_brushes, n_points = selected.shape
+    n_features = x0.shape[1]
+    count = selected.sum(1)
+    total = np.zeros((n_brushes, n_features))
+    total_sq = np.zeros((n_brushes, n_features))
+    vmin = np.full((n_brushes, n_features), np.inf)
+    vmax = np.full((n_brushes, n_features), -np.inf)
+    chunk_size = prepared.get("chunk_size", chunk_size)
+    for i in range(0, n_points, chunk_size):
+        chunk = np.asarray(x0[i : i + chunk_size])
+        if prepared["x"] is None:
+            x = (chunk.astype(np.float32) - prepared["mean"]) / prepared["scale"]
+        else:
+            x = prepared["x"][i : i + chunk_size]
+        x = x.astype(np.float64)
+        sel = selected[:, i : i + chunk_size]
+        total += sel @ x
+        total_sq += sel @ (x * x)
+        for t in np.flatnonzero(sel.any(1)):
+            rows = chunk[sel[t]]
+            vmin[t] = np.minimum(vmin[t], rows.min(0))
+            vmax[t] = np.maximum(vmax[t], rows.max(0))
+    mean = total / count[:, None]
+    var = (total_sq - count[:, None] * mean**2) / np.maximum(count - 1, 1)[:, None]
+    return mean, np.sqrt(np.maximum(var, 0)), vmin, vmax
+
+
+class Engine:
+    """
+    Interface of the engines behind compute_predicate_sequence.
+
+    An engine evaluates the bump predictor (predict_batch) and its class-weighted BCE
+    on the normalized training data, for all brushes at once.
+    Parameters a and mu, and everything returned, are numpy arrays of shape [n_brushes, n_features]
+    (or [n_brushes, ...]), so the optimizer in compute_predicate_sequence does not depend on the engine.
+
+    Parameters
+    ----------
+    prepared - result of prepare_data(x0)
+    selected - boolean numpy array, shape=[n_brushes, n_points]
+    weight_selected, weight_unselected - numpy arrays, shape=[n_brushes].
+        BCE weights of selected and unselected points of each brush
+    """
+
+    def __init__(self, prepared, selected, weight_selected, weight_unselected):
+        self.prepared = prepared
+        self.selected = selected
+
+    def loss_and_grad(self, a, mu, index=None, sample_weight=None):
+        """
+        Per-brush sum of weighted BCE, shape [n_brushes], and its gradients w.r.t. a and mu.
+
+        index - optional integer array of the rows to train on (a minibatch). Defaults to all rows
+        sample_weight - optional array, shape=[len(index)], multiplied to the BCE weights of the rows
+        """
+        raise NotImplementedError
+
+    def predict(self, a, mu):
+        """Prediction of every brush on every data point, shape [n_brushes, n_points]"""
+        raise NotImplementedError
+
+    def predict_chunks(self, a, mu):
+        """
+        Predictions of predict(a, mu) by chunks of rows, as (start, pred[:, start : start + size]),
+        so that callers that reduce over points need not hold all of them
+        """
+        yield 0, self.predict(a, mu)
+
+
+class NumpyEngine(Engine):
+    r"""
+    Pure NumPy engine with analytic gradients, evaluated over chunks of rows.
+    With $d = x - \mu$, $s = \sum_k a_k^4 d_k^4$ and $p = 1/(1+s)$,
+
+    $$ \partial s / \partial a_k = 4 a_k^3 d_k^4, \quad \partial s / \partial \mu_k = -4 a_k^4 d_k^3, \quad \partial p / \partial s = -p^2 $$
+
+    Same model and loss as the torch engines, including torch's clamping of log at -100
+    and of the BCE gradient denominator at 1e-12.
+    """
+
+    def __init__(self, prepared, selected, weight_selected, weight_unselected):
+        super().__init__(prepared, selected, weight_selected, weight_unselected)
+        self.x = prepared["x"]
+        self.weight_selected = np.asarray(weight_selected, dtype=np.float32)[:, None]
+        self.weight_unselected = np.asarray(weight_unselected, dtype=np.float32)[
+            :, None
+        ]
+
+    def _s(self, x, a4, mu):
+        """s[t, i] = sum_k a4[t, k] * d[t, i, k]^4, and d, d^3 of the chunk x"""
+        d = x[None, :, :] - mu[:, None, :]
+        d3 = d * d * d
+        d4 = d3 * d
+        s = np.matmul(d4, a4[:, :, None])[:, :, 0]
+        return s, d3, d4
+
+    def _chunk(self, n_brushes, n_features):
+        """Number of rows processed at once"""
+        return _chunk_rows(n_brushes, n_features)
+
+    def _rows(self, start, stop):
+        """Normalized training data of rows start:stop"""
+        return self.x[start:stop]
+
+    def _take(self, index):
+        """Normalized training data of the rows in index"""
+        return self.x[index]
+
+    def loss_and_grad(self, a, mu, index=None, sample_weight=None):
+        a = np.asarray(a, dtype=np.float32)
+        mu = np.asarray(mu, dtype=np.float32)
+        a4 = a**4
+        n_brushes, n_features = a.shape
+        n_rows = self.selected.shape[1] if index is None else len(index)
+        chunk = self._chunk(n_brushes, n_features)
+        bce = np.zeros(n_brushes)
+        grad_a = np.zeros((n_brushes, n_features))
+        grad_mu = np.zeros((n_brushes, n_features))
+        for i in range(0, n_rows, chunk):
+            if index is None:
+                x = self._rows(i, i + chunk)
+                label = self.selected[:, i : i + chunk]
+            else:
+                x = self._take(index[i : i + chunk])
+                label = self.selected[:, index[i : i + chunk]]
+            weight = np.where(label, self.weight_selected, self.weight_unselected)
+            if sample_weight is not None:
+                weight = weight * sample_weight[i : i + chunk]
+            s, d3, d4 = self._s(x, a4, mu)
+            pred = 1 / (1 + s)
+            # 1 - pred = s * pred, without cancellation for small s
+            log_pred = np.maximum(-np.log1p(s), -100)
+            log_1m_pred = np.maximum(np.log(s * pred), -100)
+            bce += -(weight * np.where(label, log_pred, log_1m_pred)).sum(1)
+            # d loss / d s, through d loss / d pred as in torch's BCE backward
+            grad_pred = weight * (pred - label) / np.maximum(pred * pred * s, 1e-12)
+            grad_s = grad_pred * (-pred * pred)
+            grad_mu += np.matmul(grad_s[:, None, :], d3)[:, 0]
+            grad_a += np.matmul(grad_s[:, None, :], d4)[:, 0]
+        grad_a *= 4 * a.astype(np.float64) ** 3
+        grad_mu *= -4 * a4.astype(np.float64)
+        return bce, grad_a, grad_mu
+
+    def predict(self, a, mu):
+        pred = np.empty(self.selected.shape, dtype=np.float32)
+        for i, p in self.predict_chunks(a, mu):
+            pred[:, i : i + p.shape[1]] = p
+        return pred
+
+    def predict_chunks(self, a, mu):
+        a4 = np.asarray(a, dtype=np.float32) ** 4
+        mu = np.asarray(mu, dtype=np.float32)
+        chunk = self._chunk(*a4.shape)
+        for i in range(0, self.selected.shape[1], chunk):
+            s = self._s(self._rows(i, i + chunk), a4, mu)[0]
+            s += 1
+            yield i, np.reciprocal(s, out=s)
+
+
+class StreamingEngine(NumpyEngine):
+    """
+    NumpyEngine for data that does not fit in memory (see prepare_data_streaming).
+    Rows are read from the original data x0 (e.g., a memory-mapped array)
+    and normalized chunk by chunk, at most prepared["chunk_size"] rows at a time,
+    so no normalized copy of the dataset is kept
+    """
+
+    def __init__(self, prepared, selected, weight_selected, weight_unselected):
+        super().__init__(prepared, selected, weight_selected, weight_unselected)
+        self.x0 = prepared["x0"]
+        self.mean = prepared["mean"]
+        self.scale = prepared["scale"]
+        self.chunk_size = prepared["chunk_size"]
+
+    def _chunk(self, n_brushes, n_features):
+        return min(self.chunk_size, _chunk_rows(n_brushes, n_features))
+
+    def _normalize(self, x0):
+        x = np.array(x0, dtype=np.float32)  # a copy, never a view of x0
+        x -= self.mean
+        x /= self.scale
+        return x
+
+    def _rows(self, start, stop):
+        return self._normalize(self.x0[start:stop])
+
+    def _take(self, index):
+        # sorted row reads, which memory-mapped and on-disk arrays serve sequentially
+        order = np.argsort(index, kind="stable")
+        x = np.empty((len(index), self.x0.shape[1]), dtype=np.float32)
+        x[order] = self._normalize(self.x0[index[order]])
+        return x
+
+
+def get_engine(engine):
+    """
+    Engine class from its name, or the class itself.
+    "numpy" - NumpyEngine (default)
+    "autograd", "fused" - torch engines, see torch_engine.py. Torch is imported here, on first use
+    "parallel" - ShardedEngine, data-parallel across worker processes, see parallel_engine.py
+    """
+    if isinstance(engine, type) and issubclass(engine, Engine):
+        return engine
+    if engine == "numpy":
+        return NumpyEngine
+    if engine in ("autograd", "fused"):
+        from .torch_engine import AutogradEngine, FusedEngine
+
+        return dict(autograd=AutogradEngine, fused=FusedEngine)[engine]
+    if engine == "parallel":
+        from .parallel_engine import ShardedEngine
+
+        return ShardedEngine
+    raise ValueError(f"unknown engine: {engine!r}")
+
+
+def _smoothness(a, n_brushes):
+    """Smoothness loss of `a` across consecutive brushes, and its gradient"""
+    grad = np.zeros_like(a)
+    if n_brushes == 2:
+        weight = 5
+    elif n_brushes > 2:
+        weight = 50
+    else:
+        return 0.0, grad
+    diff = a[1:] - a[:-1]
+    g = 2 * weight / diff.size * diff
+    grad[1:] += g
+    grad[:-1] -= g
+    return weight * (diff**2).mean(), grad
+
+
+def _objective(model, a, mu, n_brushes, n_points, index=None, sample_weight=None):
+    """
+    Training objective and its gradients w.r.t. a and mu:
+    the per-brush weighted BCE normalized by n_points (not batch size),
+    the smoothness loss of `a` and an L2 penalty 0.125 * |a|^2
+    (weight decay 0.25 on `a`; smaller a encourages larger range of the bounding box)
+    """
+    bce, grad_a, grad_mu = model.loss_and_grad(
+        a, mu, index=index, sample_weight=sample_weight
+    )
+    smoothness_loss, grad_smoothness = _smoothness(a, n_brushes)
+    loss = bce.sum() / n_points + smoothness_loss + 0.125 * (a**2).sum()
+    grad_a = grad_a / n_points + grad_smoothness + 0.25 * a
+    return loss, grad_a, grad_mu / n_points
+
+
+def _sgd(objective, a, mu, lr=1e-2, momentum=0.8):
+    """
+    SGD with Nesterov momentum, as torch.optim.SGD(lr=1e-2, momentum=0.8, nesterov=True).
+    Yields (loss, a, mu, n_eval) once per iteration, before stepping away from (a, mu)
+    """
+    momentum_a = None
+    momentum_mu = None
+    while True:
+        loss, grad_a, grad_mu = objective(a, mu)
+        yield loss, a, mu, 1
+        if momentum_a is None:
+            momentum_a = grad_a
+            momentum_mu = grad_mu
+        else:
+            momentum_a = momentum * momentum_a + grad_a
+            momentum_mu = momentum * momentum_mu + grad_mu
+        a = a - lr * (grad_a + momentum * momentum_a)
+        mu = mu - lr * (grad_mu + momentum * momentum_mu)
+
+
+def _lbfgs(objective, a, mu, history_size=10, max_line_search=20, max_step=0.1):
+    """
+    Full-batch L-BFGS with a backtracking (Armijo) line search.
+    Yields (loss, a, mu, n_eval) at the initial point and after each line search,
+    where n_eval is the number of objective evaluations it took.
+
+    The extents are optimized in log space, a = sign(a) * exp(b).
+    a = 0 is a stationary point of the bump predictor (its gradient is proportional to a^3),
+    so a full quasi-Newton step could otherwise zero out a useful feature for good.
+    For the same reason, each step moves every coordinate (log|a|, or mu in normalized units)
+    by at most max_step; on wide data, larger early steps shrink all extents at once
+    and end in a worse local minimum.
+    """
+    shape = a.shape
+    size = a.size
+    sign = np.where(a < 0, -1.0, 1.0)
+
+    def unpack(theta):
+        a = sign * np.exp(theta[:size].reshape(shape))
+        return a, theta[size:].reshape(shape)
+
+    def f(theta):
+        a, mu = unpack(theta)
+        loss, grad_a, grad_mu = objective(a, mu)
+        return loss, np.concatenate([(grad_a * a).ravel(), grad_mu.ravel()])
+
+    theta = np.concatenate([np.log(np.maximum(np.abs(a), 1e-12)).ravel(), mu.ravel()])
+    loss, grad = f(theta)
+    yield loss, a, mu, 1
+    history = []  # (s, y, 1 / s.y) of the most recent steps
+    while True:
+        # two-loop recursion for the quasi-Newton direction
+        q = grad.copy()
+        alphas = []
+        for s, y, rho in reversed(history):
+            alpha = rho * (s @ q)
+            q -= alpha * y
+            alphas.append(alpha)
+        if history:
+            s, y, _ = history[-1]
+            q *= (s @ y) / (y @ y)
+        else:
+            # first step (or restart): steepest descent of length at most 1, as in torch.optim.LBFGS
+            q *= min(1, 1 / np.abs(grad).sum())
+        for (s, y, rho), alpha in zip(history, reversed(alphas)):
+            q += s * (alpha - rho * (y @ q))
+        direction = -q
+        direction *= min(1, max_step / max(np.abs(direction).max(), 1e-12))
+        slope = grad @ direction
+
+        # backtracking line search
+        step = 1.0
+        n_eval = 0
+        while True:
+            new_theta = theta + step * direction
+            new_loss, new_grad = f(new_theta)
+            n_eval += 1
+            if new_loss <= loss + 1e-4 * step * slope or n_eval >= max_line_search:
+                break
+            step *= 0.5
+        if not new_loss <= loss:
+            # no decrease along this direction: stay, and restart from steepest descent
+            history.clear()
+            yield loss, a, mu, n_eval
+            continue
+        s = new_theta - theta
+        y = new_grad - grad
+        if s @ y > 1e-10:
+            history.append((s, y, 1 / (s @ y)))
+            if len(history) > history_size:
+                history.pop(0)
+        theta, loss, grad = new_theta, new_loss, new_grad
+        a, mu = unpack(theta)
+        yield loss, a, mu, n_eval
+
+
+def _predicate_qualities(model, a, mu, selected, verbose=False):
+    """Accuracy, precision, recall and f1 of the predictor of every brush on its selection"""
+    n_brushes, n_points = selected.shape
+    n_selected = selected.sum(1)
+    # quality of each brush's predicate, computed for all brushes at once
+    # and counted chunk by chunk, without a [n_brushes, n_points] prediction
+    n_predicted = np.zeros(n_brushes, dtype=int)
+    tp = np.zeros(n_brushes, dtype=int)
+    for i, p in model.predict_chunks(a, mu):
+        pred = p > 0.5
+        n_predicted += pred.sum(1)
+        tp += (pred & selected[:, i : i + pred.shape[1]]).sum(1)
+    fp = (n_predicted - tp).tolist()
+    fn = (n_selected - tp).tolist()
+    correct = (n_points - n_predicted - n_selected + 2 * tp).tolist()
+    tp = tp.tolist()
+    qualities = []
+    for t in range(n_brushes):
+        accuracy = correct[t] / n_points
+        precision = tp[t] / (tp[t] + fp[t]) if tp[t] + fp[t] > 0 else 0
+        recall = tp[t] / (tp[t] + fn[t]) if tp[t] + fn[t] > 0 else 0
+        f1 = 2 / (1 / precision + 1 / recall) if precision > 0 and recall > 0 else 0
+        if verbose:
+            print(
+                dedent(
+                    f"""
+                brush = {t}
+                accuracy = {accuracy}
+                precision = {precision}
+                recall = {recall}
+                f1 = {f1}
+            """
+                )
+            )
+        qualities.append(
+            dict(brush=t, accuracy=accuracy, precision=precision, recall=recall, f1=f1)
+        )
+    return qualities
+
+
+def _predicate_clauses(a, mu, prepared, vmin_selected, vmax_selected, attribute_names):
+    """Clauses dict(dim, interval, attribute) of the predicate of every brush, from a and mu"""
+    n_brushes = a.shape[0]
+    mean, scale = prepared["mean"], prepared["scale"]
+    # extents are object arrays when x0 is (e.g., a DataFrame with a bool column)
+    vmin = np.asarray(prepared["vmin"], dtype=float)
+    vmax = np.asarray(prepared["vmax"], dtype=float)
+    vmin_selected = np.asarray(vmin_selected, dtype=float)
+    vmax_selected = np.asarray(vmax_selected, dtype=float)
+    # predicate clause selection
+    # r is the range of the bounding box on each dimension
+    # bounding box is defined by the level set of prediction=0.5
+    # all arrays below have shape [n_brushes, n_features]
+    # denormalize
+    r = 1 / np.abs(a) * scale
+    center = mu * scale + mean
+    ci_lower = center - r
+    ci_upper = center + r
+    assert (ci_lower < ci_upper).all(), "ci[0] is not less than ci[1]"
+
+    # feature selection based on extent range
+    should_include = ~((ci_lower <= vmin) & (ci_upper >= vmax))
+    # clip intervals to the data extent, then to the extent of the selected points
+    ci_lower = np.maximum(np.maximum(ci_lower, vmin), vmin_selected)
+    ci_upper = np.minimum(np.minimum(ci_upper, vmax), vmax_selected)
+
+    # for each brush, generate a predicate from a[t] and mu[t]
+    predicates = []
+    for t in range(n_brushes):
+        predicates.append(
+            [
+                dict(
+                    dim=k,
+                    interval=[ci_lower[t, k].item(), ci_upper[t, k].item()],
+                    attribute=attribute_names[k],
+                )
+                for k in np.flatnonzero(should_include[t]).tolist()
+            ]
+        )
+    return predicates
+
+
 def compute_predicate_sequence(
     x0,
     selected,
     attribute_names=[],
     n_iter=1000,
+    tol=1e-4,
+    time_budget_ms=None,
+    minibatch=False,
+    n_unselected_samples=None,
+    warm_start=None,
+    is_cancelled=None,
+    progress=None,
+    intermediate=None,
+    intermediate_iter=None,
+    intermediate_ms=None,
+    prepared=None,
+    chunk_size=None,
+    engine="numpy",
+    solver="sgd",
+    verbose=True,
 ):
     """
     x0 - numpy array, shape=[n_points, n_feature]. Data points
     selected - boolean array. shape=[brush_index, n_points] of selection
-    """
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    n_iter - maximum number of training iterations (SGD steps, or L-BFGS line searches)
+    tol - convergence tolerance. Training stops early once both the relative change of the loss
+          and the relative change of the parameters stay below tol for several iterations.
+          None disables early stopping.
+    time_budget_ms - optional wall-clock budget of the training loop, in milliseconds.
+          When exceeded, training stops and the best parameters found so far are used.
+    minibatch - if True, each iteration trains on every point selected by any brush
+          plus a uniform sample of the remaining (unselected) points.
+          Sampled points are importance-weighted so that the loss is an unbiased estimate of the full-batch loss.
+    n_unselected_samples - number of unselected points sampled per iteration in minibatch mode.
+          Defaults to the number of selected points, i.e., a class-balanced minibatch.
+    warm_start - optional list of length n_brushes. Each entry is either None
+          or a dict(a=..., mu=...) of previously optimized parameters of that brush
+          (as returned in `parameters`), used instead of the default initialization.
+    is_cancelled - optional callable checked once per iteration.
+          When it returns True, training is abandoned by raising Cancelled.
+    progress - optional callable, called after every iteration with
+          dict(n_iter=iterations so far, loss=current training loss)
+    intermediate - optional callable for anytime use, called during training with
+          dict(predicates, qualities, n_iter, loss, elapsed_ms) of the best parameters so far,
+          in the format of the returned predicates and qualities.
+          It is called after the first iteration, then every intermediate_iter iterations
+          and/or every intermediate_ms milliseconds (250 ms if neither is given).
+          Each call scores the predicates on all points, which costs about one iteration.
+    intermediate_iter, intermediate_ms - how often intermediate is called, see above
+    prepared - optional result of prepare_data(x0), to skip data preparation,
+          or of prepare_data_streaming(x0) for out-of-core training (see chunk_size)
+    chunk_size - if given (or if `prepared` comes from prepare_data_streaming), out-of-core mode:
+          x0 is only read in chunks of at most chunk_size rows, normalized on the fly,
+          so it can be a memory-mapped array larger than memory, and peak memory is bounded
+          by chunk_size (plus the selection itself) rather than by the dataset size.
+          Requires engine="numpy".
+    engine - name of the engine evaluating the loss and its gradients, or an Engine subclass.
+          "numpy" (default) is pure NumPy and does not import torch.
+          "autograd" differentiates predict_batch and BCE with torch autograd (on cuda if available).
+          "fused" uses torch with analytic gradients and chunked evaluation,
+          which lowers peak memory and CPU time on wide datasets.
+          "parallel" splits the rows across one worker process per CPU core; it is meant
+          for large datasets (millions of rows) on many-core machines, where its speedup
+          has not been measured yet (see benchmarks/parallel_scaling.py).
+    solver - "sgd" (default) is SGD with Nesterov momentum (lr=1e-2, momentum=0.8).
+          "lbfgs" is full-batch L-BFGS with a backtracking line search,
+          which usually converges in tens of loss evaluations instead of hundreds of SGD steps.
+          It does not support minibatch.
+    verbose - if True, show a progress bar of the training loop and print the quality of each predicate
 
+    Returns
+    -------
+    predicates, qualities, parameters, info
+    parameters - dict of numpy arrays a and mu, shape=[n_brushes, n_features]
+    info - dict with the number of iterations actually run (n_iter),
+           the number of loss and gradient evaluations (n_eval),
+           why training stopped (stop_reason), the final training loss (loss)
+           and the wall-clock time of each phase (timing), a dict of
+           prepare_ms - data preparation and normalization (~0 when `prepared` is given),
+           setup_ms - parameter initialization, class weights and engine setup,
+           train_ms - the training loop, n_iter and per_iter_ms = train_ms / n_iter,
+           quality_ms - predicate quality scoring,
+           clauses_ms - clause extraction,
+           total_ms - the whole call
+    """
+    start_time = time.perf_counter()
     n_points, n_features = x0.shape
     n_brushes = selected.shape[0]
+    selected = np.asarray(selected, dtype=bool)
 
     # prepare training data
-    # orginal data extent
-    vmin = x0.min(0)
-    vmax = x0.max(0)
-    x = torch.from_numpy(x0.astype(np.float32)).to(device)
-    label = torch.from_numpy(selected).float().to(device)
-    # normalize
-    mean = x.mean(0)
-    scale = x.std(0) + 1e-6
-    x = (x - mean) / scale
+    if prepared is None:
+        if chunk_size is None:
+            prepared = prepare_data(x0)
+        else:
+            prepared = prepare_data_streaming(x0, chunk_size)
+    x = prepared["x"]
+    streaming = x is None
+    if streaming:
+        if engine != "numpy" and engine is not StreamingEngine:
+            raise ValueError(
+                f"out-of-core mode requires engine='numpy', not {engine!r}"
+            )
+        engine = StreamingEngine
+    prepare_time = time.perf_counter()
 
     # Trainable parameters
     # since data is normalized,
     # mu can initialized around mean_pos examples
     # a can initialized around a constant across all axes
-    selection_centroids = torch.stack([x[sel_t].mean(0) for sel_t in selected], 0)
-    selection_std = torch.stack([x[sel_t].std(0) for sel_t in selected], 0)
+    # (and the extent of each selection, used for clause selection below)
+    (
+        selection_centroids,
+        selection_std,
+        vmin_selected,
+        vmax_selected,
+    ) = _selection_statistics(prepared, selected)
 
     # initialize the bounding box center (mu) at the data centroid, +-0.1 at random
-    mu_init = selection_centroids
-    a_init = 1 / selection_std
-    # a = (a_init + 0.1 * (2 * torch.rand(n_brushes, n_features) - 1)).to(device)
-    # mu = mu_init + 0.1 * (2 * torch.rand(n_brushes, x.shape[1], device=device) - 1)
-    a = a_init.to(device)
-    mu = mu_init.to(device)
-    a.requires_grad_(True)
-    mu.requires_grad_(True)
+    mu_init = selection_centroids.astype(np.float64)
+    a_init = 1 / selection_std.astype(np.float64)
+    if warm_start is not None:
+        for t, init in enumerate(warm_start):
+            if init is not None:
+                a_init[t] = np.asarray(init["a"])
+                mu_init[t] = np.asarray(init["mu"])
+    a = a_init
+    mu = mu_init
 
     # For each brush,
-    # weight-balance selected vs. unselected based on their size
-    # and create a weighted BCE loss function (for each brush)
-    bce_per_brush = []
-    for st in selected:  # for each brush, define their class-balanced loss function
-        n_selected = st.sum()  # st is numpy array
-        n_unselected = n_points - n_selected
-        instance_weight = torch.ones(x.shape[0]).to(device)
-        instance_weight[st] = n_points / n_selected  # helps recall
-        instance_weight[~st] = 2 * n_points / n_unselected  # helps precision
-        bce = nn.BCELoss(weight=instance_weight)
-        bce_per_brush.append(bce)
-
-    optimizer = optim.SGD(
-        [
-            {"params": mu, "weight_decay": 0},
-            # smaller a encourages larger range of the bounding box
-            {"params": a, "weight_decay": 0.25},
-        ],
-        lr=1e-2,
-        momentum=0.8,
-        nesterov=True,
-    )
+    # weight-balance selected vs. unselected based on their size.
+    # The engine evaluates the weighted BCE of every brush in a single pass over the data
+    n_selected = selected.sum(1)  # [n_brushes], selected is numpy array
+    n_unselected = n_points - n_selected
+    # selected weight helps recall, unselected weight helps precision
+    weight_selected = n_points / n_selected
+    weight_unselected = 2 * n_points / n_unselected
+    model = get_engine(engine)(prepared, selected, weight_selected, weight_unselected)
+    rng = np.random.default_rng()
+    if minibatch:
+        # stratified sampling: keep all points selected by any brush,
+        # and sample the points unselected by all brushes uniformly (with replacement)
+        any_selected = selected.any(0)
+        selected_index = np.flatnonzero(any_selected)
+        unselected_index = np.flatnonzero(~any_selected)
+        n_pool = unselected_index.shape[0]
+        if n_unselected_samples is None:
+            n_unselected_samples = max(1, selected_index.shape[0])
+        n_unselected_samples = min(n_unselected_samples, n_pool)
+        # inverse inclusion probability of each sampled unselected point
+        importance = np.ones(selected_index.shape[0] + n_unselected_samples)
+        importance[selected_index.shape[0] :] = n_pool / max(n_unselected_samples, 1)
+
+    def objective(a, mu):
+        # In full-batch mode, the BCE term is the mean-reduced BCE of each brush;
+        # in minibatch mode, an estimate of it
+        if not minibatch:
+            return _objective(model, a, mu, n_brushes, n_points)
+        batch_index = selected_index
+        if n_unselected_samples > 0:
+            sample = rng.integers(n_pool, size=n_unselected_samples)
+            batch_index = np.concatenate([selected_index, unselected_index[sample]])
+        return _objective(
+            model, a, mu, n_brushes, n_points, batch_index, sample_weight=importance
+        )
+
+    if solver == "sgd":
+        steps = _sgd(objective, a, mu)
+        patience = 10  # number of consecutive small steps before declaring convergence
+    elif solver == "lbfgs":
+        if minibatch:
+            raise ValueError("solver='lbfgs' is full-batch, use minibatch=False")
+        steps = _lbfgs(objective, a, mu)
+        patience = 2
+    else:
+        raise ValueError(f"unknown solver: {solver!r}")
+
+    # early stopping
+    # the tracked objective includes the L2 penalty on `a`,
+    # so that it is the quantity actually being minimized
+    n_small_steps = 0
+    prev_loss = None
+    best_loss = float("inf")
+    best_a = a
+    best_mu = mu
+    stop_reason = "n_iter"
+    n_iter_run = 0
+    n_eval = 0
+    if (
+        intermediate is not None
+        and intermediate_iter is None
+        and intermediate_ms is None
+    ):
+        intermediate_ms = 250
+    setup_time = time.perf_counter()
+    intermediate_time = setup_time
 
     # training loop
-    bar = tqdm(range(n_iter))
+    bar = tqdm(range(n_iter), disable=not verbose)
     for e in bar:
-        loss_per_brush = []
-        for t, st in enumerate(selected):  # for each brush, compute loss
-            # TODO try subsample:
-
-            # use all selected data
-            # randomly sample unselected data with similar size
-            pred = predict(x, a[t], mu[t])
-            loss = bce_per_brush[t](pred, label[t])
-            # loss += (mu[t] - selection_centroids[t]).pow(2).mean() * 20
-            loss_per_brush.append(loss)
-            smoothness_loss = 0
-            if len(selected) == 2:
-                smoothness_loss += 5 * (a[1:] - a[:-1]).pow(2).mean()
-                # smoothness_loss += 1 * (mu[1:] - mu[:-1]).pow(2).mean()
-            elif len(selected) > 2:
-                smoothness_loss += 50 * (a[1:] - a[:-1]).pow(2).mean()
-                # smoothness_loss += 1 * (mu[1:] - mu[:-1]).pow(2).mean()
-
-        # print('bce', loss_per_brush)
-        # print('smoothness', smoothness_loss.item())
-        # sparsity_loss = 0
-        # sparsity_loss = a.abs().mean() * 100
-        total_loss = sum(loss_per_brush) + smoothness_loss  # + sparsity_loss
-        optimizer.zero_grad()
-        total_loss.backward()
-        optimizer.step()
-        # if e % max(1, (n_iter // 10)) == 0:
-        # print(pred.min().item(), pred.max().item())
-        bar.set_postfix({"loss": loss.item()})
-    a.detach_()
-    mu.detach_()
+        if is_cancelled is not None and is_cancelled():
+            bar.close()
+            raise Cancelled()
+        loss_value, a, mu, step_evals = next(steps)
+        n_eval += step_evals
+        bar.set_postfix({"loss": loss_value})
+        if minibatch and prev_loss is not None:
+            # smooth the noisy minibatch loss estimate
+            loss_value = 0.9 * prev_loss + 0.1 * loss_value
+        if loss_value < best_loss:
+            best_loss = loss_value
+            best_a = a
+            best_mu = mu
+        n_iter_run = e + 1
+        if progress is not None:
+            progress(dict(n_iter=n_iter_run, loss=float(loss_value)))
+        if intermediate is not None and (
+            n_iter_run == 1
+            or (intermediate_iter is not None and n_iter_run % intermediate_iter == 0)
+            or (
+                intermediate_ms is not None
+                and (time.perf_counter() - intermediate_time) * 1000 >= intermediate_ms
+            )
+        ):
+            intermediate(
+                dict(
+                    predicates=_predicate_clauses(
+                        best_a,
+                        best_mu,
+                        prepared,
+                        vmin_selected,
+                        vmax_selected,
+                        attribute_names,
+                    ),
+                    qualities=_predicate_qualities(model, best_a, best_mu, selected),
+                    n_iter=n_iter_run,
+                    loss=float(best_loss),
+                    elapsed_ms=(time.perf_counter() - start_time) * 1000,
+                )
+            )
+            intermediate_time = time.perf_counter()
+
+        if time_budget_ms is not None:
+            if (time.perf_counter() - setup_time) * 1000 > time_budget_ms:
+                stop_reason = "time_budget"
+                break
+        if tol is not None and prev_loss is not None:
+            loss_change = abs(prev_loss - loss_value) / max(abs(prev_loss), 1e-12)
+            param_norm = np.sqrt((a_prev**2).sum() + (mu_prev**2).sum())
+            param_change = np.sqrt(
+                ((a - a_prev) ** 2).sum() + ((mu - mu_prev) ** 2).sum()
+            ) / max(param_norm, 1e-12)
+            if loss_change < tol and param_change < tol:
+                n_small_steps += 1
+            else:
+                n_small_steps = 0
+            if n_small_steps >= patience:
+                stop_reason = "converged"
+                break
+        prev_loss = loss_value
+        a_prev = a
+        mu_prev = mu
+    bar.close()
+    train_time = time.perf_counter()
+
+    # use the best parameters found during training
+    a = best_a
+    mu = best_mu
     # plt.stem(a.abs().numpy()); plt.show()
 
-    qualities = []
-    for t, st in enumerate(selected):  # for each brush, compute quality
-        pred = predict(x, a[t], mu[t])
-        pred = (pred > 0.5).float()
-        correct = (pred == label[t]).float().sum().item()
-        total = n_points
-        accuracy = correct / total
-        # 1 meaning points are selected
-        tp = ((pred == 1).float() * (label == 1).float()).sum().item()
-        fp = ((pred == 1).float() * (label == 0).float()).sum().item()
-        fn = ((pred == 0).float() * (label == 1).float()).sum().item()
-        precision = tp / (tp + fp) if tp + fp > 0 else 0
-        recall = tp / (tp + fn) if tp + fn > 0 else 0
-        f1 = 2 / (1 / precision + 1 / recall) if precision > 0 and recall > 0 else 0
-        print(
-            dedent(
-                f"""
-            brush = {t}
-            accuracy = {accuracy}
-            precision = {precision}
-            recall = {recall}
-            f1 = {f1}
-        """
-            )
-        )
-        qualities.append(
-            dict(brush=t, accuracy=accuracy, precision=precision, recall=recall, f1=f1)
-        )
+    qualities = _predicate_qualities(model, a, mu, selected, verbose)
+    quality_time = time.perf_counter()
 
-    # predicate clause selection
-    # r is the range of the bounding box on each dimension
-    # bounding box is defined by the level set of prediction=0.5
-    predicates = []
-    # for each brush, generate a predicate from a[t] and mu[t]
-    for t, st in enumerate(selected):
-        r = 1 / a[t].abs()
-        predicate_clauses = []
-        for k in range(n_features):  # for each attribute
-            vmin_selected = x0[st, k].min()
-            vmax_selected = x0[st, k].max()
-            # denormalize
-            r_k = (r[k] * scale[k]).item()
-            mu_k = (mu[t, k] * scale[k] + mean[k]).item()
-            ci = [mu_k - r_k, mu_k + r_k]
-            assert ci[0] < ci[1], "ci[0] is not less than ci[1]"
-
-            # feature selection based on extent range
-            should_include = not (ci[0] <= vmin[k] and ci[1] >= vmax[k])
-            if ci[0] < vmin[k]:
-                ci[0] = vmin[k]
-            if ci[1] > vmax[k]:
-                ci[1] = vmax[k]
-            if should_include:
-                if ci[0] < vmin_selected:
-                    ci[0] = vmin_selected
-                if ci[1] > vmax_selected:
-                    ci[1] = vmax_selected
-                predicate_clauses.append(
-                    dict(
-                        dim=k,
-                        interval=ci,
-                        attribute=attribute_names[k],
-                    )
-                )
-        predicates.append(predicate_clauses)
+    predicates = _predicate_clauses(
+        a, mu, prepared, vmin_selected, vmax_selected, attribute_names
+    )
     parameters = dict(mu=mu, a=a)
-    return predicates, qualities, parameters
+    end_time = time.perf_counter()
+    timing = dict(
+        prepare_ms=(prepare_time - start_time) * 1000,
+        setup_ms=(setup_time - prepare_time) * 1000,
+        train_ms=(train_time - setup_time) * 1000,
+        n_iter=n_iter_run,
+        per_iter_ms=(train_time - setup_time) * 1000 / max(n_iter_run, 1),
+        quality_ms=(quality_time - train_time) * 1000,
+        clauses_ms=(end_time - quality_time) * 1000,
+        total_ms=(end_time - start_time) * 1000,
+    )
+    info = dict(
+        n_iter=n_iter_run,
+        n_eval=n_eval,
+        stop_reason=stop_reason,
+        loss=float(best_loss),
+        timing=timing,
+    )
+    return predicates, qualities, parameters, info
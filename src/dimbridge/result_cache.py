@@ -0,0 +1,205 @@
+"""
+Persistent on-disk cache of compute_predicate_sequence results, shared by the widget
+(Dimbridge.result_cache_dir) and the Flask app (app.py --result_cache), so that explaining
+the same selections of the same data again, after a kernel restart or in another server worker,
+costs a file read instead of a training run.
+
+Results are keyed by a content hash of the data matrix, the selection masks and the
+hyperparameters of compute_predicate_sequence (see ResultCache.key).
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+from .predicate_engine import compute_predicate_sequence
+
+# arguments of compute_predicate_sequence that change its result. Callbacks, prepared data,
+# chunk_size (out-of-core mode computes the same model), verbose and warm_start are left out;
+# a warm-started result stands for the same optimum as a cold-started one
+HYPERPARAMETERS = [
+    "attribute_names",
+    "n_iter",
+    "tol",
+    "time_budget_ms",
+    "minibatch",
+    "n_unselected_samples",
+    "engine",
+    "solver",
+]
+
+
+def data_digest(x0, chunk_size=2**16):
+    """
+    Content hash of a data matrix (shape, dtype and values), read by chunks of rows,
+    so x0 can also be a memory-mapped array or datautils.ColumnStack.
+    Object arrays (e.g., DataFrame.to_numpy() of mixed column types) are hashed as float64
+    values, since their bytes are pointers that change from one process to the next;
+    their elements must then be numbers or bools (TypeError otherwise).
+    Worth computing once per dataset, see ResultCache.key
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((tuple(x0.shape), str(x0.dtype))).encode())
+    for i in range(0, x0.shape[0], chunk_size):
+        chunk = x0[i : i + chunk_size]
+        if x0.dtype == object:
+            try:
+                chunk = np.asarray(chunk, dtype=np.float64)
+            except (TypeError, ValueError) as e:
+                raise TypeError(
+                    f"cannot hash non-numeric values of an object array: {e}"
+                ) from e
+        h.update(np.ascontiguousarray(chunk).tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Results of compute_predicate_sequence, one file per result in `directory`.
+    Files are written to a temporary name and renamed, so several processes can share
+    a directory. Hits refresh a file's modification time; once the files exceed max_bytes,
+    the least recently used ones are deleted.
+
+    Parameters
+    ----------
+    directory - cache directory, created if needed
+    max_bytes - size cap of the cache files
+    """
+
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        self.stats = dict(hits=0, misses=0, evictions=0)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, data, selected, **hyperparameters):
+        """
+        Key of a result.
+
+        data - data matrix x0, or its data_digest (to hash a dataset only once)
+        selected - boolean array, shape=[n_brushes, n_points]
+        hyperparameters - keyword arguments of compute_predicate_sequence;
+              those not in HYPERPARAMETERS are ignored, missing ones take their default value
+        """
+        if not isinstance(data, str):
+            data = data_digest(data)
+        selected = np.asarray(selected, dtype=bool)
+        defaults = inspect.signature(compute_predicate_sequence).parameters
+        params = {}
+        for name in HYPERPARAMETERS:
+            value = hyperparameters.get(name, defaults[name].default)
+            if name == "attribute_names":
+                value = [str(v) for v in value]
+            elif inspect.isclass(value):
+                value = f"{value.__module__}.{value.__qualname__}"
+            params[name] = value
+        h = hashlib.blake2b(digest_size=16)
+        h.update(data.encode())
+        h.update(repr(selected.shape).encode())
+        h.update(np.packbits(selected, axis=None).tobytes())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """Cached (predicates, qualities, parameters, info) of key, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                meta = json.loads(f["meta"].item())
+                parameters = dict(a=f["a"], mu=f["mu"])
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # missing, or being evicted or overwritten by another process
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return meta["predicates"], meta["qualities"], parameters, meta["info"]
+
+    def put(self, key, result):
+        """Store the result (predicates, qualities, parameters, info) of key, then evict"""
+        predicates, qualities, parameters, info = result
+        meta = json.dumps(dict(predicates=predicates, qualities=qualities, info=info))
+        path = self._path(key)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=np.array(meta), a=parameters["a"], mu=parameters["mu"])
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in max_bytes"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Delete every cached result"""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    @property
+    def nbytes(self):
+        return sum(
+            entry.stat().st_size
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".npz")
+        )
+
+
+def cached_predicate_sequence(cache, x0, selected, data_key=None, **kwargs):
+    """
+    compute_predicate_sequence(x0, selected, **kwargs) through a ResultCache.
+    Cached results come back with info["cached"] = True and the time of the lookup as their timing
+    (prepare_ms=0, lookup_ms, total_ms), and without calling any callback of kwargs.
+
+    cache - ResultCache, or None to always compute
+    data_key - optional data_digest(x0), to avoid hashing x0 on every call
+    """
+    if cache is None:
+        return compute_predicate_sequence(x0, selected, **kwargs)
+    start_time = time.perf_counter()
+    key = cache.key(x0 if data_key is None else data_key, selected, **kwargs)
+    result = cache.get(key)
+    if result is not None:
+        predicates, qualities, parameters, info = result
+        lookup_ms = (time.perf_counter() - start_time) * 1000
+        info = dict(
+            info,
+            cached=True,
+            timing=dict(prepare_ms=0.0, lookup_ms=lookup_ms, total_ms=lookup_ms),
+        )
+        return predicates, qualities, parameters, info
+    predicates, qualities, parameters, info = compute_predicate_sequence(
+        x0, selected, **kwargs
+    )
+    parameters = {k: np.asarray(v) for k, v in parameters.items()}
+    cache.put(key, (predicates, qualities, parameters, info))
+    return predicates, qualities, parameters, dict(info, cached=False)
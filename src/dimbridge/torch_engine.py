@@ -0,0 +1,155 @@
+"""
+Torch engines of compute_predicate_sequence (engine="autograd" or engine="fused").
+This module imports torch, so it is only imported when one of these engines is requested.
+"""
+
+import numpy as np
+import torch
+from torch import nn
+
+from .predicate_engine import Engine, _chunk_rows, predict_batch
+
+
+def predict_batch_chunked(x, a, mu):
+    """
+    Same as predict_batch, evaluated over chunks of rows of x
+    without [n_brushes, n_points, n_features] temporaries. Used by the fused engine
+    """
+    n_brushes, n_features = a.shape
+    chunk = _chunk_rows(n_brushes, n_features)
+    a4 = a.pow(4)
+    s = torch.cat(
+        [
+            # s[t, i] = sum_k a4[t, k] * d[t, i, k]^4
+            torch.einsum("tik,tk->ti", (x[i : i + chunk] - mu[:, None, :]).pow(4), a4)
+            for i in range(0, x.shape[0], chunk)
+        ],
+        1,
+    )
+    return 1 / (1 + s)
+
+
+class FusedBumpBCE(torch.autograd.Function):
+    r"""
+    Fused forward/backward of the bump predictor (predict_batch) and weighted BCE.
+
+    Returns the per-brush sum of weighted BCE, shape [n_brushes].
+    Gradients w.r.t. a and mu are derived analytically.
+    With $d = x - \mu$, $s = \sum_k a_k^4 d_k^4$ and $p = 1/(1+s)$,
+
+    $$ \partial s / \partial a_k = 4 a_k^3 d_k^4, \quad \partial s / \partial \mu_k = -4 a_k^4 d_k^3, \quad \partial p / \partial s = -p^2 $$
+
+    Data rows are processed in chunks, and only the prediction is kept for backward,
+    so no [n_brushes, n_points, n_features] autograd temporaries are materialized.
+    """
+
+    @staticmethod
+    def forward(ctx, x, a, mu, label, weight):
+        pred = predict_batch_chunked(x, a, mu)
+        loss = nn.functional.binary_cross_entropy(
+            pred, label, weight=weight, reduction="none"
+        ).sum(1)
+        ctx.save_for_backward(x, a, mu, label, weight, pred)
+        return loss
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        x, a, mu, label, weight, pred = ctx.saved_tensors
+        n_brushes, n_features = a.shape
+        chunk = _chunk_rows(n_brushes, n_features)
+        # d loss / d pred, as in torch's BCE backward (denominator clamped at 1e-12)
+        grad_pred = weight * (pred - label) / (pred * (1 - pred)).clamp(min=1e-12)
+        # d loss / d s
+        grad_s = grad_output[:, None] * grad_pred * (-pred * pred)
+        grad_a = torch.zeros_like(a)
+        grad_mu = torch.zeros_like(mu)
+        for i in range(0, x.shape[0], chunk):
+            d = x[i : i + chunk] - mu[:, None, :]
+            d3 = d.pow(3)
+            g = grad_s[:, i : i + chunk]
+            grad_mu += torch.einsum("ti,tik->tk", g, d3)
+            grad_a += torch.einsum("ti,tik->tk", g, d3 * d)
+        grad_a *= 4 * a.pow(3)
+        grad_mu *= -4 * a.pow(4)
+        return None, grad_a, grad_mu, None, None
+
+
+class AutogradEngine(Engine):
+    """
+    Differentiates predict_batch and BCE with torch autograd.
+    Runs on cuda if available
+    """
+
+    def __init__(
+        self, prepared, selected, weight_selected, weight_unselected, device=None
+    ):
+        super().__init__(prepared, selected, weight_selected, weight_unselected)
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        # the training tensor is cached next to the numpy data,
+        # so that it is copied to the device once per dataset
+        key = f"x_torch_{device}"
+        if key not in prepared:
+            prepared[key] = torch.from_numpy(prepared["x"]).to(device)
+        self.x = prepared[key]
+        self.label = torch.from_numpy(selected).float().to(device)
+        self.weight_selected = self._tensor(weight_selected)[:, None]
+        self.weight_unselected = self._tensor(weight_unselected)[:, None]
+        self.weight = None
+
+    def _tensor(self, value):
+        return torch.as_tensor(np.asarray(value), dtype=torch.float32).to(self.device)
+
+    def _bce(self, x, a, mu, label, weight):
+        pred = predict_batch(x, a, mu)  # [n_brushes, batch_size]
+        return nn.functional.binary_cross_entropy(
+            pred, label, weight=weight, reduction="none"
+        ).sum(1)
+
+    def loss_and_grad(self, a, mu, index=None, sample_weight=None):
+        a = self._tensor(a).requires_grad_(True)
+        mu = self._tensor(mu).requires_grad_(True)
+        if index is None:
+            if self.weight is None:
+                self.weight = torch.where(
+                    self.label > 0.5, self.weight_selected, self.weight_unselected
+                )
+            x, label, weight = self.x, self.label, self.weight
+        else:
+            index = torch.from_numpy(index).to(self.device)
+            x = self.x[index]
+            label = self.label[:, index]
+            weight = torch.where(
+                label > 0.5, self.weight_selected, self.weight_unselected
+            )
+            if sample_weight is not None:
+                weight = weight * self._tensor(sample_weight)
+        bce = self._bce(x, a, mu, label, weight)
+        bce.sum().backward()
+        return (
+            bce.detach().cpu().numpy().astype(np.float64),
+            a.grad.cpu().numpy().astype(np.float64),
+            mu.grad.cpu().numpy().astype(np.float64),
+        )
+
+    def predict(self, a, mu):
+        with torch.no_grad():
+            return (
+                predict_batch(self.x, self._tensor(a), self._tensor(mu)).cpu().numpy()
+            )
+
+
+class FusedEngine(AutogradEngine):
+    """
+    Uses FusedBumpBCE, with analytic gradients and chunked evaluation,
+    which lowers peak memory and CPU time on wide datasets
+    """
+
+    def _bce(self, x, a, mu, label, weight):
+        return FusedBumpBCE.apply(x, a, mu, label, weight)
+
+    def predict(self, a, mu):
+        with torch.no_grad():
+            pred = predict_batch_chunked(self.x, self._tensor(a), self._tensor(mu))
+            return pred.cpu().numpy()
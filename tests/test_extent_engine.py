@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from dimbridge.evaluation import evaluate_predicates
+from dimbridge.extent_engine import ExtentIndex, compute_extent_predicates
+from dimbridge.main import Dimbridge
+
+
+def make_frame(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        dict(
+            a=rng.normal(size=n),
+            b=rng.normal(size=n),
+            flag=rng.random(n) > 0.5,
+        )
+    )
+
+
+def test_bool_column_extents():
+    df = make_frame()
+    x0 = df.to_numpy()  # object dtype, because of the bool column
+    selected = np.stack([df.a.to_numpy() > 0.5, df.flag.to_numpy()])
+    index = ExtentIndex(x0)
+    predicates, qualities, _ = compute_extent_predicates(
+        x0, selected, attribute_names=df.columns.to_list(), index=index
+    )
+    json.dumps(predicates, allow_nan=False)
+    assert predicates[0][0]["interval"][0] == df.a[df.a > 0.5].min()
+    assert predicates[1][2]["interval"] == [1.0, 1.0]
+    assert all(q["recall"] == 1 for q in qualities)
+
+    _, with_index = evaluate_predicates(
+        x0, predicates, selected=selected, attribute_names=df.columns, index=index
+    )
+    _, without_index = evaluate_predicates(
+        x0, predicates, selected=selected, attribute_names=df.columns
+    )
+    assert with_index == without_index == qualities
+
+
+def test_widget_server_data_extent_skips_string_columns():
+    df = make_frame().assign(name="point")
+    widget = Dimbridge(
+        data=df,
+        x=df.a.to_numpy(),
+        y=df.b.to_numpy(),
+        predicate_mode="server data extent",
+        verbose=False,
+    )
+    result = widget.get_predicate([df.flag.to_numpy()])
+    attributes = [clause["attribute"] for clause in result["predicates"][0]]
+    assert attributes == ["a", "b", "flag"]